@@ -0,0 +1,106 @@
+"""
+Сравнение пропускной способности API под разными способами запуска.
+
+Запуск: python bench_api.py --url wsgi=http://127.0.0.1:8000 --url asgi=http://127.0.0.1:8001
+Каждый сервер нагружается одинаково: --concurrency клиентов в течение --duration секунд
+запрашивают страницы списка фильмов по курсору и карточки найденных фильмов.
+Серверы запускаются заранее, см. README.
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+from urllib.error import URLError
+from urllib.request import urlopen
+
+LIST_PATH = '/api/v1/movies/?page_size=50'
+
+
+class Worker(threading.Thread):
+    """Клиент: листает список по курсору, открывает карточку первого фильма страницы"""
+
+    def __init__(self, base_url, deadline):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.deadline = deadline
+        self.latencies = []
+        self.errors = 0
+
+    def request(self, path):
+        started = time.perf_counter()
+        try:
+            with urlopen(self.base_url + path, timeout=30) as response:
+                body = json.load(response)
+        except (URLError, OSError, ValueError):
+            self.errors += 1
+            return None
+        self.latencies.append(time.perf_counter() - started)
+        return body
+
+    def run(self):
+        cursor = None
+        while time.perf_counter() < self.deadline:
+            page = self.request(LIST_PATH + (f'&cursor={cursor}' if cursor else ''))
+            if not page:
+                cursor = None
+                continue
+            cursor = page['next']
+            if page['results']:
+                self.request(f"/api/v1/movies/{page['results'][0]['id']}/")
+
+
+def run(base_url, concurrency, duration):
+    """
+    @param base_url: str
+    @param concurrency: int
+    @param duration: float
+    @return: dict
+    """
+    deadline = time.perf_counter() + duration
+    workers = [Worker(base_url.rstrip('/'), deadline) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    seconds = time.perf_counter() - started
+    latencies = sorted(latency for worker in workers for latency in worker.latencies)
+    if not latencies:
+        return {'requests': 0, 'errors': sum(worker.errors for worker in workers)}
+    return {
+        'requests': len(latencies),
+        'errors': sum(worker.errors for worker in workers),
+        'requests_per_second': round(len(latencies) / seconds, 1),
+        'latency_ms': {
+            'median': round(statistics.median(latencies) * 1000, 1),
+            'p95': round(latencies[int(len(latencies) * 0.95)] * 1000, 1),
+            'max': round(latencies[-1] * 1000, 1),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочное сравнение способов запуска API')
+    parser.add_argument('--url', action='append', required=True, help='имя=адрес сервера, можно несколько раз')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--output', help='файл для результатов в JSON')
+    args = parser.parse_args()
+
+    results = {}
+    for target in args.url:
+        name, _, base_url = target.partition('=')
+        if not base_url or '://' in name:
+            name, base_url = target, target
+        results[name] = result = run(base_url, args.concurrency, args.duration)
+        print(f"{name}: {result['requests']} запросов, {result.get('requests_per_second')} rps, "
+              f"задержка {result.get('latency_ms')}, ошибок {result['errors']}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'concurrency': args.concurrency, 'duration': args.duration, 'results': results},
+                      file, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,12 @@
+import os
+
+# По умолчанию кэш в памяти процесса: у каждого воркера gunicorn свой, и сигналы очищают только его,
+# поэтому чужие воркеры видят изменения не позже CACHE_TIMEOUT.
+# Для общего кэша: CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache, CACHE_LOCATION=/var/tmp/movies
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND') or 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION') or 'movies',
+        'TIMEOUT': int(os.environ.get('CACHE_TIMEOUT') or 300),
+    }
+}
@@ -25,3 +25,16 @@ STATIC_URL = '/static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOCALE_PATH = ['movies/locale']
+
+# Начиная с этого количества строк списки в админке показывают оценку из pg_class вместо COUNT(*)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = int(os.environ.get('ADMIN_ESTIMATED_COUNT_THRESHOLD') or 100_000)
+
+# Асинхронные представления API для запуска под ASGI (config.asgi), см. README
+MOVIES_API_ASYNC = os.environ.get('MOVIES_API_ASYNC', 'FALSE').upper() == 'TRUE'
+
+# Учёт запросов к БД на каждый HTTP-запрос, см. movies.middleware.QueryBudgetMiddleware
+QUERY_BUDGET = os.environ.get('QUERY_BUDGET', 'FALSE').upper() == 'TRUE'
+QUERY_BUDGET_MAX_QUERIES = int(os.environ.get('QUERY_BUDGET_MAX_QUERIES') or 50)
+QUERY_BUDGET_MAX_DB_MS = int(os.environ.get('QUERY_BUDGET_MAX_DB_MS') or 500)
+# Столько одинаковых запросов за один HTTP-запрос считается N+1
+QUERY_BUDGET_REPEATED = int(os.environ.get('QUERY_BUDGET_REPEATED') or 10)
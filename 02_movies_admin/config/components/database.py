@@ -6,8 +6,32 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD'),
         'HOST': os.environ.get('DB_HOST', '127.0.0.1'),
         'PORT': os.environ.get('DB_PORT', 5432),
+        # Соединение живёт между запросами до DB_CONN_MAX_AGE секунд; 0 - новое соединение на каждый запрос
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE') or 60),
         'OPTIONS': {
             'options': '-c search_path=public,content'
         }
     }
 }
+
+# Реплики для чтения: DB_REPLICAS=host[:port],host[:port]. В тестах и локально репликой может быть
+# другая база на том же сервере: DB_REPLICAS=127.0.0.1:5432, DB_REPLICA_NAME=movies_replica
+DATABASE_REPLICAS = []
+for number, address in enumerate(filter(None, (os.environ.get('DB_REPLICAS') or '').split(',')), start=1):
+    host, _, port = address.strip().partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DB_REPLICA_NAME') or DATABASES['default']['NAME'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['movies.routers.ReplicaRouter']
+
+# После изменяющего запроса клиент столько секунд читает с основной БД
+DB_REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS') or 5)
+# Реплика, отстающая больше, не используется; отставание проверяется раз в DB_REPLICA_LAG_CHECK_SECONDS
+DB_REPLICA_MAX_LAG_SECONDS = float(os.environ.get('DB_REPLICA_MAX_LAG_SECONDS') or 30)
+DB_REPLICA_LAG_CHECK_SECONDS = float(os.environ.get('DB_REPLICA_LAG_CHECK_SECONDS') or 5)
@@ -13,9 +13,13 @@ SECRET_KEY = os.environ.get(
     'l+57pdz1&9n(18h0vnm+pfjwd8nw(9r6$7_gtd2=+(s6tst8rc'
 )
 
+# Панель django-debug-toolbar подключается только по запросу
+DEBUG_TOOLBAR = os.environ.get('DEBUG_TOOLBAR', 'FALSE').upper() == 'TRUE'
+
 include(
     'components/database.py',
     'components/config.py',
+    'components/cache.py',
 )
 
 INSTALLED_APPS = [
@@ -25,11 +29,12 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    "debug_toolbar",
+    'django.contrib.postgres',
     'movies',
 ]
 MIDDLEWARE = [
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
+    'movies.middleware.QueryBudgetMiddleware',
+    'movies.routers.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -39,6 +44,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+if DEBUG_TOOLBAR:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.insert(0, 'debug_toolbar.middleware.DebugToolbarMiddleware')
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -83,11 +92,19 @@ LOGGING = {
             'filters': ['require_debug_true'],
             'class': 'logging.StreamHandler',
         },
+        'queries': {
+            'level': 'INFO',
+            'class': 'logging.StreamHandler',
+        },
     },
     'loggers': {
         'django.db.backends': {
             'level': 'DEBUG',
             'handlers': ['console'],
-        }
+        },
+        'movies.queries': {
+            'level': 'INFO',
+            'handlers': ['queries'],
+        },
     }
 }
@@ -5,9 +5,12 @@ from django.urls import include, path
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('__debug__/', include('debug_toolbar.urls')),
+    path('api/', include('movies.api.urls')),
 ]
 
+if settings.DEBUG_TOOLBAR:
+    urlpatterns.append(path('__debug__/', include('debug_toolbar.urls')))
+
 urlpatterns += static(
         settings.STATIC_URL, document_root=settings.STATIC_ROOT
     )
@@ -1,20 +1,69 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.postgres.search import SearchQuery
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db import DatabaseError
+from django.db.models import Q
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from django.utils.text import smart_split, unescape_string_literal
+from django.utils.translation import gettext_lazy as _
 
-from .models import Filmwork, Genre, GenreFilmwork, Person, PersonFilmWork
+from .cache import get_genres
+from .csv_import import import_csv
+from .forms import CsvImportForm, FilmworkActionForm
+from .models import (SEARCH_CONFIG, Filmwork, Genre, GenreFilmwork, Person,
+                     PersonFilmWork)
+from .paginators import EstimatedCountPaginator
+
+
+def split_search_term(search_term):
+    """
+    Слова поисковой строки, как их разбивает стандартный поиск админки: фразы в кавычках не делятся
+    @param search_term: str
+    @return: generator[str]
+    """
+    for bit in smart_split(search_term):
+        if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+            bit = unescape_string_literal(bit)
+        yield bit
+
+
+class GenreListFilter(admin.SimpleListFilter):
+    title = _('Genres')
+    parameter_name = 'genre'
+
+    def lookups(self, request, model_admin):
+        return get_genres()
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(id__in=GenreFilmwork.objects.filter(genre_id=self.value()).values('film_work_id'))
+        return queryset
 
 
 class GenreFilmworkInline(admin.TabularInline):
     model = GenreFilmwork
+    autocomplete_fields = ('genre',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('genre')
 
 
 class PersonFilmWorkInline(admin.TabularInline):
     model = PersonFilmWork
+    # Инлайн показывается и у фильма, и у персоны: связь с родителем Django в форму не выводит
+    autocomplete_fields = ('film_work', 'person')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('film_work', 'person')
 
 
 @admin.register(Genre)
 class GenreAdmin(admin.ModelAdmin):
     list_display = ('name',)
-    search_fields = ('name',)
+    search_fields = ('name__trigram_icontains',)
     ordering = ('name',)
 
 
@@ -22,15 +71,91 @@ class GenreAdmin(admin.ModelAdmin):
 class FilmworkAdmin(admin.ModelAdmin):
     inlines = (GenreFilmworkInline, PersonFilmWorkInline,)
     list_display = ('title', 'type', 'creation_date', 'rating',)
-    list_filter = ('type',)
-    search_fields = ('title', 'genres__name')
+    list_filter = ('type', GenreListFilter)
+    search_fields = ('title__trigram_icontains', 'genres__name__trigram_icontains')
     date_hierarchy = 'creation_date'
     ordering = ('-creation_date', '-rating',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    action_form = FilmworkActionForm
+    actions = ('set_rating', 'set_type')
+
+    def bulk_update(self, request, queryset, field_name):
+        """
+        Одно UPDATE ... WHERE id IN (...) по выбранным фильмам (или по условиям списка, если выбраны все).
+        Значение проверяется валидаторами поля модели, как при сохранении формы
+        @return: int | None - обновлено строк, None - значение не прошло проверку
+        """
+        field = Filmwork._meta.get_field(field_name)
+        if not request.POST.get(field_name):
+            self.message_user(request, f"{field.verbose_name}: {_('enter a value')}", messages.ERROR)
+            return None
+        try:
+            value = field.clean(request.POST[field_name], None)
+        except ValidationError as error:
+            self.message_user(request, f"{field.verbose_name}: {' '.join(error.messages)}", messages.ERROR)
+            return None
+        updated = queryset.update(**{field_name: value, 'modified': timezone.now()})
+        self.message_user(request, _('Updated: %d') % updated, messages.SUCCESS)
+        return updated
+
+    @admin.action(description=_('Set rating'), permissions=['change'])
+    def set_rating(self, request, queryset):
+        self.bulk_update(request, queryset, 'rating')
+
+    @admin.action(description=_('Set type'), permissions=['change'])
+    def set_type(self, request, queryset):
+        self.bulk_update(request, queryset, 'type')
+
+    def get_urls(self):
+        return [
+            path('import-csv/', self.admin_site.admin_view(self.import_csv_view), name='movies_filmwork_import_csv'),
+        ] + super().get_urls()
+
+    def import_csv_view(self, request):
+        """Загрузка CSV фильмов и их состава, см. movies.csv_import"""
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+        form = CsvImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            try:
+                result = import_csv(form.cleaned_data['film_works'], form.cleaned_data['cast'])
+            except (ValidationError, DatabaseError) as error:
+                form.add_error(None, ' '.join(error.messages) if isinstance(error, ValidationError) else str(error))
+            else:
+                self.message_user(request, _('Imported films: %(film_works)d, cast: %(cast)d') % result,
+                                  messages.SUCCESS)
+                return redirect('admin:movies_filmwork_changelist')
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': _('Import CSV'),
+            'form': form,
+        }
+        return TemplateResponse(request, 'admin/movies/filmwork/import_csv.html', context)
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Каждое слово ищется подстрокой в названии (триграммный индекс), словом в title и description
+        (индекс по search_vector) и в названиях жанров. Жанры подбираются по кэшированному списку:
+        пока жанр не найден, условие по фильмам целиком обслуживается индексами,
+        а фильмы найденных жанров берутся подзапросом, без JOIN и повторяющихся строк
+        """
+        genres = get_genres() if search_term else []
+        for bit in split_search_term(search_term):
+            condition = Q(title__trigram_icontains=bit) | Q(search_vector=SearchQuery(bit, config=SEARCH_CONFIG))
+            genre_ids = [genre_id for genre_id, name in genres if bit.casefold() in name.casefold()]
+            if genre_ids:
+                condition |= Q(id__in=GenreFilmwork.objects.filter(genre_id__in=genre_ids).values('film_work_id'))
+            queryset = queryset.filter(condition)
+        return queryset, False
 
 
 @admin.register(Person)
 class PersonAdmin(admin.ModelAdmin):
     inlines = (PersonFilmWorkInline,)
     list_display = ('full_name',)
-    search_fields = ('full_name',)
+    search_fields = ('full_name__trigram_icontains',)
     ordering = ('full_name',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
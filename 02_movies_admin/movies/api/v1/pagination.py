@@ -0,0 +1,102 @@
+import base64
+import binascii
+import datetime
+import uuid
+
+from django.db.models import BooleanField, DateField, F, Func, UUIDField, Value
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+# В курсоре фильм без creation_date: в порядке (creation_date, id) такие фильмы идут последними
+NO_DATE = '-'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class RowGreaterThan(Func):
+    """
+    (a, b) > (x, y) - сравнение строк. Postgres выполняет его одним диапазоном по составному индексу,
+    в отличие от a > x OR (a = x AND b > y)
+    """
+    output_field = BooleanField()
+
+    def __init__(self, left, right):
+        """
+        @param left: tuple[Expression]
+        @param right: tuple[Expression] - той же длины
+        """
+        self.width = len(left)
+        super().__init__(*left, *right)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        parts, params = [], []
+        for expression in self.get_source_expressions():
+            sql, expression_params = compiler.compile(expression)
+            parts.append(sql)
+            params.extend(expression_params)
+        return f"({', '.join(parts[:self.width])}) > ({', '.join(parts[self.width:])})", params
+
+
+def encode_cursor(creation_date, film_work_id):
+    """
+    @param creation_date: date | None
+    @param film_work_id: UUID
+    @return: str
+    """
+    value = f'{creation_date.isoformat() if creation_date else NO_DATE}|{film_work_id}'
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    @param cursor: str
+    @return: tuple(date | None, UUID)
+    """
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        creation_date, film_work_id = value.split('|')
+        return (None if creation_date == NO_DATE else datetime.date.fromisoformat(creation_date),
+                uuid.UUID(film_work_id))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as error:
+        raise InvalidCursor(cursor) from error
+
+
+def get_page_keys(queryset, page_size, after=None):
+    """
+    Ключи (creation_date, id) страницы фильмов после курсора.
+    Фильмы с датой выбираются сравнением строк (creation_date, id) > (%s, %s), которое Postgres
+    выполняет диапазоном по индексу film_work_creation_date_id_idx, без OFFSET. NULL в сравнении строк
+    не участвует, поэтому фильмы без даты добираются вторым запросом по тому же индексу
+    @param queryset: QuerySet[Filmwork]
+    @param page_size: int
+    @param after: tuple(date | None, UUID) | None
+    @return: tuple(list[tuple(date | None, UUID)], bool) - ключи и есть ли следующая страница
+    """
+    keys = []
+    if after is None or after[0] is not None:
+        dated = queryset.filter(creation_date__isnull=False)
+        if after is not None:
+            dated = dated.filter(RowGreaterThan(
+                (F('creation_date'), F('id')),
+                (Value(after[0], output_field=DateField()), Value(after[1], output_field=UUIDField())),
+            ))
+        keys = list(dated.order_by('creation_date', 'id').values_list('creation_date', 'id')[:page_size + 1])
+    if len(keys) <= page_size:
+        undated = queryset.filter(creation_date__isnull=True)
+        if after is not None and after[0] is None:
+            undated = undated.filter(id__gt=after[1])
+        keys += undated.order_by('id').values_list('creation_date', 'id')[:page_size + 1 - len(keys)]
+    return keys[:page_size], len(keys) > page_size
+
+
+def get_page_size(value):
+    """
+    @param value: str | None - параметр page_size запроса
+    @return: int
+    """
+    try:
+        return min(max(int(value), 1), MAX_PAGE_SIZE) if value else DEFAULT_PAGE_SIZE
+    except ValueError:
+        return DEFAULT_PAGE_SIZE
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.urls import path
+from movies.api.v1 import views
+
+if settings.MOVIES_API_ASYNC:
+    list_view, detail_view = views.async_movies_list, views.async_movie_detail
+else:
+    list_view, detail_view = views.MoviesListApi.as_view(), views.MoviesDetailApi.as_view()
+
+urlpatterns = [
+    path('movies/', list_view),
+    path('movies/export/', views.MoviesExportApi.as_view()),
+    path('movies/<uuid:pk>/', detail_view),
+]
@@ -0,0 +1,127 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (Http404, HttpResponseNotAllowed, JsonResponse,
+                         StreamingHttpResponse)
+from django.views import View
+from movies.api.v1.pagination import (InvalidCursor, decode_cursor,
+                                      encode_cursor, get_page_keys,
+                                      get_page_size)
+from movies.export import FORMATS, get_export_queryset, iter_export
+from movies.models import Filmwork
+
+
+def get_movies_queryset():
+    """
+    Фильмы с жанрами и персонами по ролям одним запросом, как в выгрузке (movies.export): каждая связь
+    собирается своим подзапросом ARRAY(SELECT ...), без соединения жанров с персонами и GROUP BY.
+    Разные персоны с одинаковым именем - разные строки связей, поэтому в массиве каждая из них
+    @return: QuerySet[dict]
+    """
+    return get_export_queryset()
+
+
+def get_movies_page(page_size, after=None):
+    """
+    Не больше трёх запросов независимо от номера страницы: ключи страницы (два, если она доходит
+    до фильмов без даты) и сами фильмы с агрегатами
+    @param page_size: int
+    @param after: tuple(date | None, UUID) | None
+    @return: dict
+    """
+    keys, has_next = get_page_keys(Filmwork.objects.all(), page_size, after)
+    movies = {movie['id']: movie for movie in get_movies_queryset().filter(id__in=[key[1] for key in keys])}
+    return {
+        'next': encode_cursor(*keys[-1]) if has_next else None,
+        'results': [movies[film_work_id] for _, film_work_id in keys if film_work_id in movies],
+    }
+
+
+def get_movie(film_work_id):
+    """
+    @param film_work_id: UUID
+    @return: dict | None
+    """
+    return get_movies_queryset().filter(id=film_work_id).first()
+
+
+def parse_list_params(request):
+    """
+    @param request: HttpRequest
+    @return: tuple(int, tuple(date | None, UUID) | None)
+    """
+    cursor = request.GET.get('cursor')
+    return get_page_size(request.GET.get('page_size')), decode_cursor(cursor) if cursor else None
+
+
+class MoviesListApi(View):
+    """GET /api/v1/movies/?page_size=50&cursor=..."""
+    http_method_names = ['get']
+
+    def get(self, request, *args, **kwargs):
+        try:
+            page_size, after = parse_list_params(request)
+        except InvalidCursor:
+            return JsonResponse({'error': 'invalid cursor'}, status=400)
+        return JsonResponse(get_movies_page(page_size, after))
+
+
+class MoviesDetailApi(View):
+    """GET /api/v1/movies/<id>/ - один запрос"""
+    http_method_names = ['get']
+
+    def get(self, request, *args, **kwargs):
+        movie = get_movie(kwargs['pk'])
+        if movie is None:
+            raise Http404
+        return JsonResponse(movie)
+
+
+class MoviesExportApi(View):
+    """
+    GET /api/v1/movies/export/?format=ndjson|csv - весь каталог потоком, см. movies.export. Только для staff.
+    Только под WSGI: ASGI-обработчик Django 3.2 перебирает потоковый ответ в event loop, где серверный курсор
+    QuerySet.iterator() вызывает SynchronousOnlyOperation, а собрать весь каталог в память заранее - значит
+    отказаться от потока. Под ASGI выгрузка доступна командой export_movies
+    """
+    http_method_names = ['get']
+    content_types = {'ndjson': 'application/x-ndjson; charset=utf-8', 'csv': 'text/csv; charset=utf-8'}
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            return JsonResponse({'error': 'staff only'}, status=403)
+        if isinstance(request, ASGIRequest):
+            return JsonResponse({'error': 'export is available under WSGI or via manage.py export_movies'},
+                                status=501)
+        export_format = request.GET.get('format', 'ndjson')
+        if export_format not in FORMATS:
+            return JsonResponse({'error': f"format must be one of {', '.join(FORMATS)}"}, status=400)
+        response = StreamingHttpResponse(iter_export(export_format), content_type=self.content_types[export_format])
+        response['Content-Disposition'] = f'attachment; filename="movies.{export_format}"'
+        return response
+
+
+# Асинхронные варианты для ASGI (MOVIES_API_ASYNC, по умолчанию выключено). ORM в Django 3.2 синхронный:
+# sync_to_async выполняет все запросы процесса по одному в одном потоке, поэтому обращения к БД не идут параллельно,
+# и на чтении каталога ASGI медленнее WSGI (замер в README).
+# Это функции: View.as_view() в Django 3.2 синхронная и не дожидается async def get
+
+
+async def async_movies_list(request):
+    """GET /api/v1/movies/?page_size=50&cursor=..."""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        page_size, after = parse_list_params(request)
+    except InvalidCursor:
+        return JsonResponse({'error': 'invalid cursor'}, status=400)
+    return JsonResponse(await sync_to_async(get_movies_page)(page_size, after))
+
+
+async def async_movie_detail(request, pk):
+    """GET /api/v1/movies/<id>/"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    movie = await sync_to_async(get_movie)(pk)
+    if movie is None:
+        raise Http404
+    return JsonResponse(movie)
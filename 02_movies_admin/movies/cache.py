@@ -0,0 +1,89 @@
+from django.core.cache import cache
+from django.db import models
+
+from .routers import PRIMARY
+
+KEY_PREFIX = 'movies:'
+GENRES = 'genres'
+FILM_WORK_YEARS = 'film_work_years'
+
+
+def _count(name, outcome):
+    """
+    Счётчики хранятся в том же кэше, что и данные: с общим кэшем команда cache_stats видит их из другого процесса
+    @param name: str
+    @param outcome: str - 'hits' | 'misses'
+    """
+    key = f'{KEY_PREFIX}stats:{name}:{outcome}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def get_or_set(name, compute):
+    """
+    @param name: str - GENRES | FILM_WORK_YEARS
+    @param compute: function() -> any - читает с основной БД (PRIMARY): значение с отстающей реплики
+        осталось бы в кэше и после инвалидации
+    @return: any
+    """
+    value = cache.get(f'{KEY_PREFIX}{name}')
+    if value is not None:
+        _count(name, 'hits')
+        return value
+    _count(name, 'misses')
+    value = compute()
+    cache.set(f'{KEY_PREFIX}{name}', value)
+    return value
+
+
+def invalidate(name):
+    cache.delete(f'{KEY_PREFIX}{name}')
+
+
+def _stats_keys():
+    return {
+        (name, outcome): f'{KEY_PREFIX}stats:{name}:{outcome}'
+        for name in (GENRES, FILM_WORK_YEARS) for outcome in ('hits', 'misses')
+    }
+
+
+def get_stats():
+    """
+    @return: dict{name: dict{'hits': int, 'misses': int}}
+    """
+    keys = _stats_keys()
+    values = cache.get_many(keys.values())
+    stats = {}
+    for (name, outcome), key in keys.items():
+        stats.setdefault(name, {})[outcome] = values.get(key, 0)
+    return stats
+
+
+def reset_stats():
+    cache.delete_many(_stats_keys().values())
+
+
+def get_genres():
+    """
+    @return: list[tuple(id, name)] - все жанры по алфавиту
+    """
+    from .models import Genre
+
+    return get_or_set(GENRES, lambda: list(Genre.objects.using(PRIMARY).order_by('name').values_list('id', 'name')))
+
+
+class CachedDatesQuerySet(models.QuerySet):
+    """
+    QuerySet менеджера Filmwork.objects. date_hierarchy на каждой загрузке списка выполняет
+    queryset.dates(field, 'year') - DISTINCT по всей таблице. Годы неотфильтрованного списка фильмов
+    берутся из кэша
+    """
+
+    def dates(self, field_name, kind, order='ASC'):
+        if field_name != 'creation_date' or kind != 'year' or self.query.where:
+            return super().dates(field_name, kind, order)
+        years = get_or_set(FILM_WORK_YEARS,
+                           lambda: list(super(CachedDatesQuerySet, self.using(PRIMARY)).dates(field_name, kind)))
+        return years if order == 'ASC' else years[::-1]
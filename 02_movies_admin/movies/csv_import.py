@@ -0,0 +1,121 @@
+"""
+Импорт фильмов и их состава из CSV: файлы потоком передаются в Postgres через COPY
+во временные таблицы, проверяются и переносятся в content одним INSERT ... SELECT на таблицу.
+"""
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import connection, transaction
+
+from . import cache
+from .models import Filmwork, PersonFilmWork
+
+FILM_WORK_COLUMNS = ('id', 'title', 'description', 'creation_date', 'rating', 'type')
+CAST_COLUMNS = ('film_work_id', 'person_id', 'full_name', 'role')
+MAX_ERRORS = 10
+
+
+def get_rating_bounds():
+    """
+    Границы рейтинга из валидаторов поля, чтобы проверка в SQL не расходилась с формой
+    @return: tuple(float, float)
+    """
+    validators = Filmwork._meta.get_field('rating').validators
+    lower = next(validator.limit_value for validator in validators if isinstance(validator, MinValueValidator))
+    upper = next(validator.limit_value for validator in validators if isinstance(validator, MaxValueValidator))
+    return lower, upper
+
+
+def copy_csv(cursor, table, columns, file):
+    """
+    @param cursor: CursorWrapper
+    @param table: str
+    @param columns: tuple[str]
+    @param file: file_object - загруженный файл, читается порциями
+    """
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, HEADER true)", file)
+
+
+def check(cursor, sql, params, message):
+    """
+    @param cursor: CursorWrapper
+    @param sql: str - запрос, возвращающий неверные строки
+    @param params: list
+    @param message: str
+    @raise ValidationError: если нашлась хоть одна строка
+    """
+    cursor.execute(f'{sql} LIMIT {MAX_ERRORS}', params)
+    rows = cursor.fetchall()
+    if rows:
+        raise ValidationError(f"{message}: {', '.join(str(row[0]) for row in rows)}")
+
+
+def import_film_works(cursor, file):
+    cursor.execute(
+        'CREATE TEMP TABLE import_film_work (id uuid, title text, description text, creation_date date, '
+        'rating float, type text) ON COMMIT DROP'
+    )
+    copy_csv(cursor, 'import_film_work', FILM_WORK_COLUMNS, file)
+    lower, upper = get_rating_bounds()
+    types = [value for value, _ in Filmwork.TYPE_CHOICES]
+    check(cursor, "SELECT id FROM import_film_work WHERE id IS NULL OR coalesce(title, '') = ''", [],
+          'Не указаны id или title у фильмов')
+    check(cursor, 'SELECT id FROM import_film_work WHERE rating < %s OR rating > %s', [lower, upper],
+          f'Рейтинг вне диапазона {lower}-{upper}')
+    check(cursor, 'SELECT id FROM import_film_work WHERE type IS NULL OR type <> ALL(%s)', [types],
+          f"Тип не из {', '.join(types)}")
+    cursor.execute(
+        'INSERT INTO content.filmwork (id, title, description, creation_date, rating, type, created, modified) '
+        "SELECT id, title, nullif(description, ''), creation_date, rating, type, now(), now() "
+        'FROM import_film_work '
+        'ON CONFLICT (id) DO UPDATE SET title = EXCLUDED.title, description = EXCLUDED.description, '
+        'creation_date = EXCLUDED.creation_date, rating = EXCLUDED.rating, type = EXCLUDED.type, modified = now()'
+    )
+    return cursor.rowcount
+
+
+def import_cast(cursor, file):
+    cursor.execute(
+        'CREATE TEMP TABLE import_cast (film_work_id uuid, person_id uuid, full_name text, role text) ON COMMIT DROP'
+    )
+    copy_csv(cursor, 'import_cast', CAST_COLUMNS, file)
+    roles = [value for value, _ in PersonFilmWork.ROLE_CHOICES]
+    check(cursor, "SELECT film_work_id FROM import_cast WHERE film_work_id IS NULL OR person_id IS NULL "
+          "OR coalesce(full_name, '') = ''", [], 'Не указаны person_id или full_name в составе фильмов')
+    check(cursor, 'SELECT person_id FROM import_cast WHERE role IS NULL OR role <> ALL(%s)', [roles],
+          f"Роль не из {', '.join(roles)} у персон")
+    check(cursor, 'SELECT DISTINCT film_work_id FROM import_cast c '
+          'WHERE NOT EXISTS (SELECT 1 FROM content.filmwork f WHERE f.id = c.film_work_id)',
+          [], 'Нет фильмов')
+    cursor.execute(
+        'INSERT INTO content.person (id, full_name, created, modified) '
+        'SELECT DISTINCT ON (person_id) person_id, full_name, now(), now() FROM import_cast '
+        'ON CONFLICT (id) DO UPDATE SET full_name = EXCLUDED.full_name, modified = now() '
+        'WHERE person.full_name IS DISTINCT FROM EXCLUDED.full_name'
+    )
+    # id связи вычисляется из её содержимого: повторный импорт того же файла не создаёт дублей
+    cursor.execute(
+        'INSERT INTO content.person_filmwork (id, film_work_id, person_id, role, created) '
+        'SELECT DISTINCT md5(film_work_id::text || person_id::text || role)::uuid, film_work_id, person_id, role, '
+        'now() FROM import_cast '
+        'ON CONFLICT DO NOTHING'
+    )
+    return cursor.rowcount
+
+
+def import_csv(film_works_file=None, cast_file=None):
+    """
+    Всё в одной транзакции: при любой ошибке в content не попадает ничего
+    @param film_works_file: file_object | None - CSV с колонками FILM_WORK_COLUMNS и строкой заголовка
+    @param cast_file: file_object | None - CSV с колонками CAST_COLUMNS и строкой заголовка
+    @return: dict{'film_works': int, 'cast': int} - вставлено или обновлено строк
+    @raise ValidationError: неверные данные
+    """
+    result = {'film_works': 0, 'cast': 0}
+    with transaction.atomic(), connection.cursor() as cursor:
+        if film_works_file is not None:
+            result['film_works'] = import_film_works(cursor, film_works_file)
+        if cast_file is not None:
+            result['cast'] = import_cast(cursor, cast_file)
+    if result['film_works']:
+        cache.invalidate(cache.FILM_WORK_YEARS)
+    return result
@@ -0,0 +1,104 @@
+"""
+Потоковая выгрузка каталога: фильмы с жанрами и персонами по ролям.
+
+Связи собираются подзапросами ARRAY(SELECT ...) для каждой строки фильма, без GROUP BY по всей таблице,
+поэтому Postgres отдаёт строки по мере чтения, а QuerySet.iterator() читает их серверным (именованным)
+курсором порциями по chunk_size. Память не зависит от размера каталога.
+"""
+import csv
+import json
+
+from django.contrib.postgres.fields import ArrayField
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import OuterRef, Subquery, TextField
+
+from .models import Filmwork, GenreFilmwork, PersonFilmWork
+
+FIELDS = ('id', 'title', 'description', 'creation_date', 'rating', 'type')
+CHUNK_SIZE = 2000
+FORMATS = ('ndjson', 'csv')
+# Разделитель имён в колонках-массивах CSV
+CSV_ARRAY_SEPARATOR = '|'
+
+
+class ArraySubquery(Subquery):
+    """ARRAY(SELECT ...) - в Django 3.2 его ещё нет"""
+    template = 'ARRAY(%(subquery)s)'
+
+    def __init__(self, queryset, **kwargs):
+        super().__init__(queryset, output_field=ArrayField(TextField()), **kwargs)
+
+    def resolve_expression(self, *args, **kwargs):
+        # Django 3.2 убирает ORDER BY из подзапроса без LIMIT, а порядок элементов массива нужен
+        ordering = self.query.order_by
+        clone = super().resolve_expression(*args, **kwargs)
+        clone.query.order_by = ordering
+        return clone
+
+
+def get_role_names():
+    return [f'{role}s' for role, _ in PersonFilmWork.ROLE_CHOICES]
+
+
+def get_export_queryset():
+    """
+    @return: QuerySet[dict]
+    """
+    genres = GenreFilmwork.objects.filter(film_work=OuterRef('pk')).order_by('genre__name').values('genre__name')
+    roles = {
+        f'{role}s': ArraySubquery(
+            PersonFilmWork.objects.filter(film_work=OuterRef('pk'), role=role)
+            .order_by('person__full_name').values('person__full_name')
+        )
+        for role, _ in PersonFilmWork.ROLE_CHOICES
+    }
+    return Filmwork.objects.order_by().values(*FIELDS).annotate(genres=ArraySubquery(genres), **roles)
+
+
+def iter_film_works(chunk_size=CHUNK_SIZE):
+    """
+    @param chunk_size: int
+    @return: generator[dict]
+    """
+    return get_export_queryset().iterator(chunk_size=chunk_size)
+
+
+class _Echo:
+    """Файл для csv.writer, который возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def iter_ndjson(rows):
+    """
+    @param rows: iterable[dict]
+    @return: generator[str]
+    """
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def iter_csv(rows):
+    """
+    @param rows: iterable[dict]
+    @return: generator[str]
+    """
+    columns = FIELDS + ('genres',) + tuple(get_role_names())
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([
+            CSV_ARRAY_SEPARATOR.join(row[column]) if isinstance(row[column], list) else row[column]
+            for column in columns
+        ])
+
+
+def iter_export(export_format, chunk_size=CHUNK_SIZE):
+    """
+    @param export_format: str - 'ndjson' | 'csv'
+    @param chunk_size: int
+    @return: generator[str]
+    """
+    rows = iter_film_works(chunk_size)
+    return iter_ndjson(rows) if export_format == 'ndjson' else iter_csv(rows)
@@ -0,0 +1,27 @@
+from django import forms
+from django.contrib.admin.helpers import ActionForm
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
+
+from .models import Filmwork
+
+
+class FilmworkActionForm(ActionForm):
+    """Значения для массовых действий: поля выводятся рядом со списком действий"""
+    rating = forms.CharField(label=_('rating'), required=False,
+                             widget=forms.TextInput(attrs={'size': 4}))
+    type = forms.ChoiceField(label=_('type'), required=False,
+                             choices=[('', '---------')] + Filmwork.TYPE_CHOICES)
+
+
+class CsvImportForm(forms.Form):
+    film_works = forms.FileField(label=_('Films'), required=False,
+                                 help_text='CSV: id, title, description, creation_date, rating, type')
+    cast = forms.FileField(label=_('Cast'), required=False,
+                           help_text='CSV: film_work_id, person_id, full_name, role')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('film_works') and not cleaned_data.get('cast'):
+            raise ValidationError(_('Choose at least one file'))
+        return cleaned_data
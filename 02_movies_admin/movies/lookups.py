@@ -0,0 +1,18 @@
+from django.db.models import CharField, TextField
+from django.db.models.lookups import IContains
+
+
+@CharField.register_lookup
+@TextField.register_lookup
+class TrigramIContains(IContains):
+    """
+    Поиск подстроки без учёта регистра через ILIKE.
+    Встроенный icontains оборачивает колонку в UPPER(), и GIN-индекс gin_trgm_ops по колонке не используется
+    """
+    lookup_name = 'trigram_icontains'
+
+    def as_sql(self, compiler, connection):
+        lhs_sql, params = self.process_lhs(compiler, connection)
+        rhs_sql, rhs_params = self.process_rhs(compiler, connection)
+        params.extend(rhs_params)
+        return f'{lhs_sql} ILIKE {rhs_sql}', params
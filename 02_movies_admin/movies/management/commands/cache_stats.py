@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from movies import cache
+
+
+class Command(BaseCommand):
+    help = 'Попадания и промахи кэша справочников админки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='обнулить счётчики после вывода')
+
+    def handle(self, *args, **options):
+        for name, stats in cache.get_stats().items():
+            total = stats['hits'] + stats['misses']
+            ratio = f"{stats['hits'] / total:.1%}" if total else '-'
+            self.stdout.write(f"{name}: {stats['hits']} попаданий, {stats['misses']} промахов, {ratio}")
+        if options['reset']:
+            cache.reset_stats()
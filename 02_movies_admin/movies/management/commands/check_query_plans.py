@@ -0,0 +1,91 @@
+import json
+
+from django.contrib.postgres.search import SearchQuery
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+from movies.api.v1.pagination import get_page_keys
+from movies.models import (SEARCH_CONFIG, Filmwork, Genre, GenreFilmwork,
+                           Person, PersonFilmWork)
+
+# Таблицы, которые на реальных объёмах нельзя читать целиком
+LARGE_TABLES = ('filmwork', 'person', 'genre_filmwork', 'person_filmwork')
+PAGE_SIZE = 100
+
+
+def iter_plan_nodes(plan):
+    """
+    @param plan: dict - узел плана из EXPLAIN (FORMAT JSON)
+    @return: generator[dict]
+    """
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from iter_plan_nodes(child)
+
+
+def get_seq_scans(queryset):
+    """
+    @param queryset: QuerySet
+    @return: tuple(list[str], dict) - большие таблицы, прочитанные Seq Scan, и план
+    """
+    plan = json.loads(queryset.explain(format='json'))[0]['Plan']
+    return [node['Relation Name'] for node in iter_plan_nodes(plan)
+            if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in LARGE_TABLES], plan
+
+
+class Command(BaseCommand):
+    help = ('Проверяет по EXPLAIN, что основные запросы админки и API используют индексы. '
+            'Запускать на заполненной базе (03_sqlite_to_postgres/generate_data.py + load_data.py): '
+            'на маленьких таблицах планировщик законно выбирает Seq Scan')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--analyze', action='store_true', help='обновить статистику таблиц перед проверкой')
+        parser.add_argument('--term', default='star', help='строка поиска для запросов поиска')
+
+    def get_queries(self, database, term):
+        """
+        @return: dict{name: QuerySet} - запросы в том виде, в каком их строят админка и API
+        """
+        films = Filmwork.objects.using(database)
+        person = Person.objects.using(database).order_by('id').first()
+        genre = Genre.objects.using(database).order_by('id').first()
+        first_keys, _ = get_page_keys(films, PAGE_SIZE)
+        if person is None or genre is None or not first_keys:
+            raise CommandError('База пуста: заполните её перед проверкой')
+        search = Q(title__trigram_icontains=term) | Q(search_vector=SearchQuery(term, config=SEARCH_CONFIG))
+        return {
+            'список фильмов': films.order_by('-creation_date', '-rating', '-id')[:PAGE_SIZE],
+            'поиск фильмов': films.filter(search).order_by('-creation_date', '-rating', '-id')[:PAGE_SIZE],
+            'поиск персон': Person.objects.using(database).filter(full_name__trigram_icontains=term)
+            .order_by('full_name', 'id')[:PAGE_SIZE],
+            'фильмы персоны': PersonFilmWork.objects.using(database).filter(person=person)
+            .values('film_work_id', 'role'),
+            'фильмы жанра': films.filter(
+                id__in=GenreFilmwork.objects.using(database).filter(genre=genre).values('film_work_id')
+            ).order_by('-creation_date', '-rating', '-id')[:PAGE_SIZE],
+            'состав фильма': PersonFilmWork.objects.using(database).filter(film_work_id=first_keys[0][1])
+            .select_related('person'),
+            'страница API': films.filter(creation_date__isnull=False)
+            .extra(where=['(creation_date, id) > (%s, %s)'], params=first_keys[-1])
+            .order_by('creation_date', 'id').values_list('creation_date', 'id')[:PAGE_SIZE + 1],
+        }
+
+    def handle(self, *args, **options):
+        database = options['database']
+        if options['analyze']:
+            with connections[database].cursor() as cursor:
+                for table in LARGE_TABLES:
+                    cursor.execute(f'ANALYZE content.{table}')
+
+        failed = []
+        for name, queryset in self.get_queries(database, options['term']).items():
+            seq_scans, plan = get_seq_scans(queryset)
+            status = self.style.ERROR('Seq Scan: ' + ', '.join(seq_scans)) if seq_scans else self.style.SUCCESS('ok')
+            self.stdout.write(f"{name}: {plan['Node Type']}, стоимость {plan['Total Cost']}, {status}")
+            if options['verbosity'] > 1:
+                self.stdout.write(queryset.explain())
+            if seq_scans:
+                failed.append(name)
+        if failed:
+            raise CommandError(f"Полный просмотр больших таблиц в запросах: {', '.join(failed)}")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from movies.export import CHUNK_SIZE, FORMATS, iter_export
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка фильмов с жанрами и персонами в NDJSON или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--output', help='файл, по умолчанию stdout')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='строк за одно чтение курсора')
+
+    def handle(self, *args, **options):
+        if options['output'] is None:
+            for line in iter_export(options['format'], options['chunk_size']):
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as file:
+            for line in iter_export(options['format'], options['chunk_size']):
+                file.write(line)
@@ -0,0 +1,67 @@
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('movies.queries')
+
+
+class QueryRecorder:
+    """
+    execute_wrapper для всех соединений на время запроса. SQL приходит с плейсхолдерами,
+    без параметров, поэтому сам текст запроса и есть его форма: N+1 - одна форма много раз
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.shapes[sql] += 1
+
+
+class QueryBudgetMiddleware:
+    """
+    Количество запросов и время БД на каждый HTTP-запрос: строка в лог movies.queries
+    и заголовок Server-Timing. Запросы сверх бюджета и повторяющиеся формы (N+1) - предупреждением.
+    При QUERY_BUDGET=FALSE Django исключает middleware из цепочки, накладных расходов нет
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        view = getattr(request.resolver_match, 'view_name', None) or request.path
+        db_ms = recorder.seconds * 1000
+        response['Server-Timing'] = f'db;dur={db_ms:.1f};desc="{recorder.count} queries"'
+        logger.info('%s %s: %d запросов, %.1f мс в БД', request.method, view, recorder.count, db_ms)
+
+        repeated = [(sql, count) for sql, count in recorder.shapes.most_common(3)
+                    if count >= settings.QUERY_BUDGET_REPEATED]
+        if repeated:
+            logger.warning('%s %s: похоже на N+1, повторяются запросы: %s', request.method, view,
+                           '; '.join(f'{count} x {sql}' for sql, count in repeated))
+        if recorder.count > settings.QUERY_BUDGET_MAX_QUERIES or db_ms > settings.QUERY_BUDGET_MAX_DB_MS:
+            logger.warning('%s %s: превышен бюджет, %d запросов (бюджет %d), %.1f мс в БД (бюджет %d)',
+                           request.method, view, recorder.count, settings.QUERY_BUDGET_MAX_QUERIES,
+                           db_ms, settings.QUERY_BUDGET_MAX_DB_MS)
+        return response
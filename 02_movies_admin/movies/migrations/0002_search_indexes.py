@@ -0,0 +1,60 @@
+# Generated by Django 3.2 on 2026-10-18 12:00
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+SEARCH_VECTOR_TRIGGER = """
+CREATE TRIGGER film_work_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, description, search_vector ON content.filmwork
+    FOR EACH ROW EXECUTE PROCEDURE tsvector_update_trigger(search_vector, 'pg_catalog.simple', title, description);
+-- существующие строки пересчитывает тот же триггер
+UPDATE content.filmwork SET search_vector = NULL;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='filmwork',
+            name='genres',
+            field=models.ManyToManyField(through='movies.GenreFilmwork', to='movies.Genre', verbose_name='Genres'),
+        ),
+        migrations.AddField(
+            model_name='filmwork',
+            name='persons',
+            field=models.ManyToManyField(through='movies.PersonFilmWork', to='movies.Person', verbose_name='Cast'),
+        ),
+        migrations.AddField(
+            model_name='filmwork',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='genre',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='genre_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='person',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['full_name'], name='person_full_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='filmwork',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='film_work_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunSQL(
+            SEARCH_VECTOR_TRIGGER,
+            reverse_sql='DROP TRIGGER film_work_search_vector_update ON content.filmwork;',
+        ),
+        migrations.AddIndex(
+            model_name='filmwork',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='film_work_search_vector_idx'),
+        ),
+    ]
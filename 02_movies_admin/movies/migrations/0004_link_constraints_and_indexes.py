@@ -0,0 +1,101 @@
+# Generated by Django 3.2 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Уникальность связей, как в 01_schema_design/movies_databases.ddl. Повторные связи, добавленные
+# до этой миграции, не удаляются молча: миграция останавливается, и их нужно разобрать вручную
+CHECK_DUPLICATE_LINKS = """
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM content.genre_filmwork GROUP BY film_work_id, genre_id HAVING COUNT(*) > 1
+    ) OR EXISTS (
+        SELECT 1 FROM content.person_filmwork GROUP BY film_work_id, person_id, role HAVING COUNT(*) > 1
+    ) THEN
+        RAISE EXCEPTION 'Повторные связи в genre_filmwork (film_work_id, genre_id) '
+            'или person_filmwork (film_work_id, person_id, role): удалите их перед миграцией';
+    END IF;
+END
+$$;
+"""
+
+# Индексы внешних ключей из 0001: их заменяют уникальные ограничения и покрывающие индексы.
+# AlterField(db_index=False) их не удаляет - Django не находит индексы таблиц с db_table "content"."..."
+FOREIGN_KEY_INDEXES = (
+    ('genre_filmwork', 'film_work_id', 'genre_filmwork_film_work_id_8065a3fb'),
+    ('genre_filmwork', 'genre_id', 'genre_filmwork_genre_id_d3bba77f'),
+    ('person_filmwork', 'film_work_id', 'person_filmwork_film_work_id_ff74bbfc'),
+    ('person_filmwork', 'person_id', 'person_filmwork_person_id_c01da924'),
+)
+DROP_FOREIGN_KEY_INDEXES = [f'DROP INDEX IF EXISTS content.{name};' for _, _, name in FOREIGN_KEY_INDEXES]
+CREATE_FOREIGN_KEY_INDEXES = [
+    f'CREATE INDEX IF NOT EXISTS {name} ON content.{table} ({column});' for table, column, name in FOREIGN_KEY_INDEXES
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0003_film_work_creation_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CHECK_DUPLICATE_LINKS, reverse_sql=migrations.RunSQL.noop),
+        migrations.RemoveIndex(
+            model_name='genrefilmwork',
+            name='genre_film_work_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='personfilmwork',
+            name='film_work_person_idx',
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(DROP_FOREIGN_KEY_INDEXES, reverse_sql=CREATE_FOREIGN_KEY_INDEXES),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='genrefilmwork',
+                    name='film_work',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='movies.filmwork'),
+                ),
+                migrations.AlterField(
+                    model_name='genrefilmwork',
+                    name='genre',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='movies.genre'),
+                ),
+                migrations.AlterField(
+                    model_name='personfilmwork',
+                    name='film_work',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='movies.filmwork'),
+                ),
+                migrations.AlterField(
+                    model_name='personfilmwork',
+                    name='person',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='movies.person'),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='genrefilmwork',
+            constraint=models.UniqueConstraint(fields=('film_work', 'genre'), name='genre_film_work_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='personfilmwork',
+            constraint=models.UniqueConstraint(fields=('film_work', 'person', 'role'),
+                                              name='film_work_person_role_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='genrefilmwork',
+            index=models.Index(fields=['genre'], include=('film_work',), name='genre_film_work_genre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='personfilmwork',
+            index=models.Index(fields=['person'], include=('film_work', 'role'), name='person_film_work_person_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filmwork',
+            index=models.Index(fields=['-creation_date', '-rating', '-id'], name='film_work_admin_order_idx'),
+        ),
+    ]
@@ -1,9 +1,16 @@
 import uuid
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from .cache import CachedDatesQuerySet
+
+# Конфигурация полнотекстового поиска, с которой триггер заполняет Filmwork.search_vector
+SEARCH_CONFIG = 'simple'
+
 
 class TimeStampedMixin(models.Model):
     created = models.DateTimeField(auto_now_add=True)
@@ -26,7 +33,10 @@ class Genre(UUIDMixin):
 
     class Meta:
         db_table = "content\".\"genre"
-        indexes = [models.Index(fields=['name'], name='genre_name_idx')]
+        indexes = [
+            models.Index(fields=['name'], name='genre_name_idx'),
+            GinIndex(fields=['name'], name='genre_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
         verbose_name = _('Genres')
         verbose_name_plural = _('Genres')
 
@@ -35,13 +45,16 @@ class Genre(UUIDMixin):
 
 
 class GenreFilmwork(UUIDMixin):
-    film_work = models.ForeignKey('Filmwork', on_delete=models.CASCADE)
-    genre = models.ForeignKey('Genre', on_delete=models.CASCADE)
+    # Отдельные индексы по внешним ключам не нужны: их заменяют индексы из Meta
+    film_work = models.ForeignKey('Filmwork', on_delete=models.CASCADE, db_index=False)
+    genre = models.ForeignKey('Genre', on_delete=models.CASCADE, db_index=False)
     created = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         db_table = "content\".\"genre_filmwork"
-        indexes = [models.Index(fields=['film_work_id', 'genre_id'], name='genre_film_work_idx')]
+        constraints = [models.UniqueConstraint(fields=['film_work', 'genre'], name='genre_film_work_idx')]
+        # Фильмы жанра читаются только из индекса (index-only scan)
+        indexes = [models.Index(fields=['genre'], include=['film_work'], name='genre_film_work_genre_idx')]
         verbose_name = _('Genres')
         verbose_name_plural = _('Genres')
 
@@ -54,7 +67,10 @@ class Person(UUIDMixin, TimeStampedMixin):
 
     class Meta:
         db_table = "content\".\"person"
-        indexes = [models.Index(fields=['full_name'], name='person_full_name_idx')]
+        indexes = [
+            models.Index(fields=['full_name'], name='person_full_name_idx'),
+            GinIndex(fields=['full_name'], name='person_full_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
         verbose_name = _('Actor')
         verbose_name_plural = _('Actor')
 
@@ -68,14 +84,20 @@ class PersonFilmWork(UUIDMixin):
         ('actor', _('actor')),
         ('director', _('director'))
     ]
-    film_work = models.ForeignKey('Filmwork', on_delete=models.CASCADE)
-    person = models.ForeignKey('Person', on_delete=models.CASCADE)
+    film_work = models.ForeignKey('Filmwork', on_delete=models.CASCADE, db_index=False)
+    person = models.ForeignKey('Person', on_delete=models.CASCADE, db_index=False)
     role = models.CharField(_('role'), max_length=10, choices=ROLE_CHOICES)
     created = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         db_table = "content\".\"person_filmwork"
-        indexes = [models.Index(fields=['film_work_id', 'person_id'], name='film_work_person_idx')]
+        # Роль - часть связи: один человек может быть и режиссёром, и сценаристом фильма
+        constraints = [
+            models.UniqueConstraint(fields=['film_work', 'person', 'role'], name='film_work_person_role_idx'),
+        ]
+        indexes = [
+            models.Index(fields=['person'], include=['film_work', 'role'], name='person_film_work_person_idx'),
+        ]
         verbose_name = _('Cast')
         verbose_name_plural = _('Cast')
 
@@ -94,12 +116,24 @@ class Filmwork(UUIDMixin, TimeStampedMixin):
     rating = models.FloatField(_('rating'), blank=True, null=True, validators=[MinValueValidator(0),
                                                                                MaxValueValidator(10)])
     type = models.CharField(_('type'), max_length=50, choices=TYPE_CHOICES)
+    genres = models.ManyToManyField('Genre', through='GenreFilmwork', verbose_name=_('Genres'))
+    persons = models.ManyToManyField('Person', through='PersonFilmWork', verbose_name=_('Cast'))
+    # Заполняется триггером в БД из title и description (см. миграцию 0002)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = CachedDatesQuerySet.as_manager()
 
     class Meta:
         db_table = "content\".\"filmwork"
         indexes = [
             models.Index(fields=['title'], name='film_work_title_idx'),
             models.Index(fields=['creation_date'], name='film_work_creation_date_idx'),
+            # Keyset-пагинация API по (creation_date, id)
+            models.Index(fields=['creation_date', 'id'], name='film_work_creation_date_id_idx'),
+            # Сортировка списка в админке: FilmworkAdmin.ordering и id, который добавляет ChangeList
+            models.Index(fields=['-creation_date', '-rating', '-id'], name='film_work_admin_order_idx'),
+            GinIndex(fields=['title'], name='film_work_title_trgm_idx', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['search_vector'], name='film_work_search_vector_idx'),
         ]
         verbose_name = _('Films')
         verbose_name_plural = _('Films')
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def get_estimated_count(model, using='default'):
+    """
+    Оценка количества строк таблицы из статистики планировщика, без прохода по таблице
+    @param model: Model
+    @param using: str
+    @return: int | None - None, если таблица ещё ни разу не анализировалась
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [connection.ops.quote_name(model._meta.db_table)],
+        )
+        row = cursor.fetchone()
+    # До первого ANALYZE reltuples равен -1 (Postgres 14+) или 0
+    return row[0] if row and row[0] > 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Для неотфильтрованного списка большой таблицы количество строк берётся из pg_class.reltuples.
+    Отфильтрованные списки и таблицы меньше settings.ADMIN_ESTIMATED_COUNT_THRESHOLD считаются точно
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where and not query.distinct:
+            estimate = get_estimated_count(self.object_list.model, self.object_list.db)
+            if estimate is not None and estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
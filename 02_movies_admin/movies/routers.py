@@ -0,0 +1,103 @@
+"""
+Чтения моделей movies идут на реплики (DATABASE_REPLICAS), записи и всё остальное - на default.
+
+Чтения остаются на основной БД, если:
+- запрос сам что-то записал или открыта транзакция на default;
+- клиент записывал недавно: ReplicaPinningMiddleware ставит cookie на DB_REPLICA_STICKY_SECONDS,
+  чтобы страница после сохранения не показала старые данные с отстающей реплики;
+- отставание всех реплик больше DB_REPLICA_MAX_LAG_SECONDS или они недоступны.
+"""
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = 'default'
+PIN_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+END
+"""
+
+# Читать с основной БД до конца текущего запроса. None - вне HTTP-запроса (команды, фоновые задачи):
+# закреплять там нечего, а выставленный флаг остался бы в контексте потока навсегда
+pinned_to_primary = ContextVar('pinned_to_primary', default=None)
+# alias -> (время проверки, реплика годна для чтения)
+_replica_health = {}
+
+
+def is_replica_usable(alias):
+    """
+    Отставание проверяется не чаще раза в DB_REPLICA_LAG_CHECK_SECONDS на процесс
+    @param alias: str
+    @return: bool
+    """
+    now = time.monotonic()
+    checked_at, usable = _replica_health.get(alias, (None, True))
+    if checked_at is not None and now - checked_at < settings.DB_REPLICA_LAG_CHECK_SECONDS:
+        return usable
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(LAG_SQL)
+            lag = cursor.fetchone()[0]
+        usable = lag is None or lag <= settings.DB_REPLICA_MAX_LAG_SECONDS
+        if not usable:
+            logger.warning('Реплика %s отстаёт на %.1f с, чтения идут на %s', alias, lag, PRIMARY)
+    except DatabaseError:
+        logger.exception('Реплика %s недоступна, чтения идут на %s', alias, PRIMARY)
+        usable = False
+    _replica_health[alias] = now, usable
+    return usable
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'movies' or not settings.DATABASE_REPLICAS:
+            return None
+        if pinned_to_primary.get() or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        replicas = [alias for alias in settings.DATABASE_REPLICAS if is_replica_usable(alias)]
+        return random.choice(replicas) if replicas else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        if pinned_to_primary.get() is not None:
+            pinned_to_primary.set(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaPinningMiddleware:
+    """
+    Read-after-write: изменяющий запрос и запросы клиента в следующие DB_REPLICA_STICKY_SECONDS
+    читают с основной БД. Внутри любого запроса чтения после записи идут туда же (см. db_for_write)
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        unsafe = request.method not in SAFE_METHODS
+        token = pinned_to_primary.set(unsafe or PIN_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            pinned_to_primary.reset(token)
+        if unsafe:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.DB_REPLICA_STICKY_SECONDS, httponly=True,
+                                samesite='Lax')
+        return response
@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cache
+from .models import Filmwork, Genre
+
+
+@receiver([post_save, post_delete], sender=Genre)
+def invalidate_genres(sender, **kwargs):
+    cache.invalidate(cache.GENRES)
+
+
+@receiver(post_save, sender=Filmwork)
+def invalidate_film_work_years_on_save(sender, update_fields=None, **kwargs):
+    # Годы зависят только от creation_date
+    if update_fields is None or 'creation_date' in update_fields:
+        cache.invalidate(cache.FILM_WORK_YEARS)
+
+
+@receiver(post_delete, sender=Filmwork)
+def invalidate_film_work_years_on_delete(sender, **kwargs):
+    cache.invalidate(cache.FILM_WORK_YEARS)
@@ -0,0 +1,74 @@
+import datetime
+import json
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from movies.api.v1.pagination import encode_cursor
+from movies.models import (Filmwork, Genre, GenreFilmwork, Person,
+                           PersonFilmWork)
+
+
+class MoviesApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.film_works = [
+            Filmwork.objects.create(title=f'Film {number}', type='movie',
+                                    creation_date=datetime.date(2000, 1, 1) if number < 3 else None)
+            for number in range(5)
+        ]
+        drama, comedy = Genre.objects.create(name='Drama'), Genre.objects.create(name='Comedy')
+        # Разные персоны с одинаковым именем
+        first, second = Person.objects.create(full_name='John Smith'), Person.objects.create(full_name='John Smith')
+        director = Person.objects.create(full_name='Jane Doe')
+        film_work = cls.film_works[0]
+        for genre in (drama, comedy):
+            GenreFilmwork.objects.create(film_work=film_work, genre=genre)
+        for person, role in ((first, 'actor'), (second, 'actor'), (director, 'director')):
+            PersonFilmWork.objects.create(film_work=film_work, person=person, role=role)
+
+    def test_detail(self):
+        movie = self.client.get(f'/api/v1/movies/{self.film_works[0].id}/').json()
+        self.assertEqual(movie['genres'], ['Comedy', 'Drama'])
+        self.assertEqual(movie['actors'], ['John Smith', 'John Smith'])
+        self.assertEqual(movie['directors'], ['Jane Doe'])
+        self.assertEqual(movie['writers'], [])
+
+    def test_detail_not_found(self):
+        self.assertEqual(self.client.get('/api/v1/movies/00000000-0000-0000-0000-000000000000/').status_code, 404)
+
+    def test_pages(self):
+        expected = sorted(self.film_works, key=lambda film_work: (film_work.creation_date is None, film_work.id))
+        ids, cursor = [], None
+        for _ in expected:
+            page = self.client.get('/api/v1/movies/', {'page_size': 2, **({'cursor': cursor} if cursor else {})})
+            page = page.json()
+            ids += [movie['id'] for movie in page['results']]
+            cursor = page['next']
+            if cursor is None:
+                break
+        self.assertEqual(ids, [str(film_work.id) for film_work in expected])
+
+    def test_cursor_after_date(self):
+        dated = sorted(film_work.id for film_work in self.film_works[:3])
+        page = self.client.get('/api/v1/movies/', {'cursor': encode_cursor(datetime.date(2000, 1, 1), dated[0])})
+        self.assertEqual([movie['id'] for movie in page.json()['results'][:2]], [str(dated[1]), str(dated[2])])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/v1/movies/', {'cursor': '!'}).status_code, 400)
+
+
+class MoviesExportApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Filmwork.objects.create(title='Film', type='movie')
+        cls.staff = User.objects.create_user('staff', is_staff=True)
+
+    def test_staff_only(self):
+        self.client.force_login(User.objects.create_user('user'))
+        self.assertEqual(self.client.get('/api/v1/movies/export/').status_code, 403)
+
+    def test_ndjson(self):
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/v1/movies/export/')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Film'])
@@ -0,0 +1,56 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import path
+from movies.api.v1 import views
+from movies.models import Filmwork
+
+# Маршруты API в режиме MOVIES_API_ASYNC: movies.api.v1.urls выбирает представления при импорте
+urlpatterns = [
+    path('api/v1/movies/', views.async_movies_list),
+    path('api/v1/movies/export/', views.MoviesExportApi.as_view()),
+    path('api/v1/movies/<uuid:pk>/', views.async_movie_detail),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncMoviesApiTest(TestCase):
+    """Запросы проходят через ASGI-обработчик Django (AsyncClient)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.film_works = [
+            Filmwork.objects.create(title=f'Film {number}', type='movie', creation_date=datetime.date(2000, 1, number))
+            for number in range(1, 4)
+        ]
+
+    def setUp(self):
+        self.async_client = AsyncClient()
+        self.async_client.force_login(User.objects.create_user('staff', is_staff=True))
+
+    async def test_list(self):
+        # AsyncClient в Django 3.2 не переносит data в query_string: параметры передаются в пути
+        response = await self.async_client.get('/api/v1/movies/?page_size=2')
+        self.assertEqual(response.status_code, 200)
+        page = response.json()
+        self.assertEqual([movie['title'] for movie in page['results']], ['Film 1', 'Film 2'])
+        response = await self.async_client.get(f"/api/v1/movies/?page_size=2&cursor={page['next']}")
+        self.assertEqual([movie['title'] for movie in response.json()['results']], ['Film 3'])
+
+    async def test_detail(self):
+        response = await self.async_client.get(f'/api/v1/movies/{self.film_works[0].id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['title'], 'Film 1')
+
+    async def test_detail_not_found(self):
+        response = await self.async_client.get('/api/v1/movies/00000000-0000-0000-0000-000000000000/')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_method_not_allowed(self):
+        response = await self.async_client.post('/api/v1/movies/')
+        self.assertEqual(response.status_code, 405)
+
+    async def test_export_wsgi_only(self):
+        response = await self.async_client.get('/api/v1/movies/export/')
+        self.assertEqual(response.status_code, 501)
@@ -0,0 +1,73 @@
+import datetime
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from movies.cache import get_genres
+from movies.models import Filmwork, Genre
+from movies.routers import PRIMARY, ReplicaPinningMiddleware, pinned_to_primary
+
+REPLICA = settings.DATABASE_REPLICAS[0] if settings.DATABASE_REPLICAS else None
+
+
+@skipUnless(REPLICA, 'нужна реплика: DB_REPLICAS=127.0.0.1:5432, в тестах она зеркало default (TEST MIRROR)')
+class ReplicaRouterTest(TransactionTestCase):
+    """Транзакции TestCase закрепили бы все чтения за основной БД, поэтому TransactionTestCase"""
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        # flush не видит таблицы схемы content (db_table "content"."..."), поэтому строки удаляются явно
+        Filmwork.objects.all().delete()
+        Genre.objects.all().delete()
+
+    def request(self, method, view):
+        """
+        @param method: str
+        @param view: function() -> any - выполняется внутри запроса
+        @return: any
+        """
+        result = []
+        middleware = ReplicaPinningMiddleware(lambda request: result.append(view()) or HttpResponse())
+        middleware(getattr(RequestFactory(), method)('/'))
+        return result[0]
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.request('get', lambda: Filmwork.objects.all().db), REPLICA)
+
+    def test_unsafe_request_reads_primary(self):
+        self.assertEqual(self.request('post', lambda: Filmwork.objects.all().db), PRIMARY)
+
+    def test_read_after_write_in_request(self):
+        def view():
+            Genre.objects.create(name='Drama')
+            return Filmwork.objects.all().db
+        self.assertEqual(self.request('get', view), PRIMARY)
+        self.assertEqual(self.request('get', lambda: Filmwork.objects.all().db), REPLICA)
+
+    def test_write_outside_request_does_not_pin(self):
+        Genre.objects.create(name='Drama')
+        self.assertIsNone(pinned_to_primary.get())
+        self.assertEqual(Filmwork.objects.all().db, REPLICA)
+
+    def test_replica_mirrors_primary(self):
+        Genre.objects.create(name='Drama')
+        self.assertEqual(list(Genre.objects.values_list('name', flat=True)), ['Drama'])
+
+    def test_cached_values_read_primary(self):
+        Genre.objects.create(name='Drama')
+        Filmwork.objects.create(title='Film', type='movie', creation_date=datetime.date(2000, 1, 1))
+        with CaptureQueriesContext(connections[PRIMARY]) as primary, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            genres, years = self.request('get', lambda: (
+                get_genres(), Filmwork.objects.dates('creation_date', 'year')))
+        self.assertEqual([name for _, name in genres], ['Drama'])
+        self.assertEqual(list(years), [datetime.date(2000, 1, 1)])
+        self.assertEqual(len(primary), 2)
+        self.assertFalse([query for query in replica if 'genre' in query['sql'] or 'filmwork' in query['sql']])
@@ -0,0 +1,97 @@
+"""
+Микробенчмарк преобразования строк SQLite: прежний fill_dataclass (dataclass без __slots__,
+setattr по списку полей, который собирается заново на каждую строку) против RowMapper.
+Запуск: python bench_mapping.py [количество строк]
+"""
+import sys
+import timeit
+import tracemalloc
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from table_objects import Filmwork, RowMapper
+
+FIELDS = ('id', 'title', 'description', 'creation_date', 'rating', 'type', 'created', 'modified')
+
+
+@dataclass()
+class LegacyFilmwork:
+    id: uuid = field(default=None)
+    title: str = field(default=None)
+    description: str = field(default=None)
+    creation_date: datetime = field(default=None)
+    file_path: str = field(default=None)
+    rating: float = field(default=None)
+    type: str = field(default=None)
+    created: datetime = field(default=None)
+    modified: datetime = field(default=None)
+
+
+def legacy_fill_dataclass(data, table):
+    result = []
+    for columns in data:
+        fields = {
+            LegacyFilmwork: ['id', 'title', 'description', 'creation_date',
+                             'file_path', 'rating', 'type', 'created', 'modified']
+        }
+        Table = table()
+        for column_data in columns:
+            field_name = fields[table].pop(0)
+            setattr(Table, field_name, column_data)
+        result.append(Table)
+    return result
+
+
+def legacy_to_rows(items):
+    return [tuple(getattr(item, field_name) for field_name in FIELDS) for item in items]
+
+
+def make_rows(count):
+    """
+    @param count: int
+    @return: list[tuple] - строки в формате SELECT rowid, * FROM film_work
+    """
+    timestamp = '2021-06-16 20:14:09.221855+00'
+    return [
+        (rowid, str(uuid.uuid4()), f'Title {rowid}', 'Description', '2020-01-01', None, 7.5, 'movie',
+         timestamp, timestamp)
+        for rowid in range(count)
+    ]
+
+
+def measure_memory(build):
+    """
+    @param build: function() -> list
+    @return: int - байт, занятых результатом
+    """
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main(count):
+    rows = make_rows(count)
+    legacy_rows = [row[1:] for row in rows]
+    description = [('rowid',)] + [(name,) for name in range(9)]
+    mapper = RowMapper.positional(Filmwork, description)
+    to_output = mapper.output(FIELDS)
+
+    cases = {
+        'legacy: fill_dataclass + getattr': lambda: legacy_to_rows(legacy_fill_dataclass(legacy_rows, LegacyFilmwork)),
+        'RowMapper: строка -> кортеж': lambda: list(map(to_output, rows)),
+        'legacy: fill_dataclass (объекты)': lambda: legacy_fill_dataclass(legacy_rows, LegacyFilmwork),
+        'RowMapper: строка -> объект': lambda: mapper.to_records(rows),
+    }
+    print(f'{count} строк film_work')
+    for name, case in cases.items():
+        seconds = min(timeit.repeat(case, number=1, repeat=3))
+        memory = measure_memory(case)
+        print(f'{name:<36} {seconds / count * 10 ** 9:8.0f} нс/строка {memory / count:8.0f} байт/строка')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,196 @@
+"""
+Нагрузочный тест загрузчика: полная загрузка SQLite-базы (см. generate_data.py) в локальный Postgres.
+
+Запуск: python benchmark.py --sqlite bench.sqlite --writer copy_text --writer values --output results.json
+Параметры Postgres берутся из переменных окружения, как у load_data.py. Таблицы content очищаются!
+
+Каждый прогон выполняется в отдельном процессе, чтобы пиковый RSS одного прогона не влиял на следующий.
+Результаты пишутся в JSON вместе с версией загрузчика; --compare сравнивает их с результатами прошлого запуска.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from dataclasses import replace
+from datetime import datetime, timezone
+from itertools import product
+
+import psycopg2
+from dotenv import load_dotenv
+from load_data import (BATCH_SIZE, MIGRATIONS, LoadOptions, load_from_sqlite,
+                       load_from_sqlite_parallel)
+from readers import open_sqlite
+from writers import DEFAULT_WRITER
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def get_peak_rss_kb(children=False):
+    """
+    @param children: bool - пик среди завершившихся дочерних процессов, а не текущего
+    @return: int | None
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # macOS возвращает байты, Linux - килобайты
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def get_loader_version():
+    """
+    @return: str | None - коммит, на котором запущен тест
+    """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def count_sqlite_rows(sqlite_path):
+    """
+    @param sqlite_path: str
+    @return: dict{table: количество строк}
+    """
+    with closing(sqlite3.connect(sqlite_path)) as connection:
+        return {
+            migration.sqlite_table: connection.execute(f"SELECT COUNT(*) FROM {migration.sqlite_table}").fetchone()[0]
+            for migration in MIGRATIONS
+        }
+
+
+def run_load(sqlite_path, dsl, options):
+    """
+    Один прогон полной загрузки, выполняется в отдельном процессе
+    @param sqlite_path: str
+    @param dsl: dict
+    @param options: LoadOptions
+    @return: dict
+    """
+    with tempfile.TemporaryDirectory() as state_dir:
+        options = replace(options, incremental=False, progress=False,
+                          checkpoint_dir=os.path.join(state_dir, 'checkpoints'),
+                          watermarks_path=os.path.join(state_dir, 'watermarks.json'))
+        started = time.perf_counter()
+        if options.workers > 1:
+            stats = load_from_sqlite_parallel(sqlite_path, dsl, options)
+        else:
+            with closing(open_sqlite(sqlite_path)) as sqlite_conn, closing(psycopg2.connect(**dsl)) as pg_conn:
+                stats = load_from_sqlite(sqlite_conn, pg_conn, options)
+        seconds = time.perf_counter() - started
+
+    rows = sum(table_stats.rows for table_stats in stats.values())
+    return {
+        'writer': options.writer_backend,
+        'batch_size': options.batch_size,
+        'workers': options.workers,
+        'read_workers': options.read_workers,
+        'seconds': round(seconds, 3),
+        'rows': rows,
+        'rows_per_second': round(rows / seconds) if seconds else None,
+        'peak_rss_kb': get_peak_rss_kb(),
+        'peak_workers_rss_kb': get_peak_rss_kb(children=True),
+        'tables': {
+            table: {
+                'rows': table_stats.rows,
+                'seconds': round(table_stats.seconds, 3),
+                'rows_per_second': round(table_stats.rows / table_stats.seconds) if table_stats.seconds else None,
+                'stages': table_stats.stages,
+            }
+            for table, table_stats in stats.items()
+        },
+    }
+
+
+def run_in_subprocess(sqlite_path, dsl, options):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(run_load, sqlite_path, dsl, options).result()
+
+
+def compare(runs, previous_path):
+    """
+    Печатает изменение rows/s относительно прогонов с теми же параметрами из прошлого файла результатов
+    @param runs: list[dict]
+    @param previous_path: str
+    """
+    with open(previous_path, encoding='utf-8') as file:
+        previous = json.load(file)
+
+    def key(run):
+        return run['writer'], run['batch_size'], run['workers'], run.get('read_workers', 1)
+
+    baseline = {}
+    for run in previous['runs']:
+        baseline.setdefault(key(run), []).append(run['rows_per_second'])
+    print(f"Сравнение с {previous_path} (версия {previous.get('loader_version')}):")
+    for run in runs:
+        if key(run) not in baseline or not run['rows_per_second']:
+            continue
+        before, after = max(baseline[key(run)]), run['rows_per_second']
+        print(f'  {key(run)}: {before} -> {after} rows/s ({after / before - 1:+.1%})')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест загрузки SQLite -> Postgres')
+    parser.add_argument('--sqlite', default='bench.sqlite', help='SQLite-база, см. generate_data.py')
+    parser.add_argument('--writer', action='append',
+                        help=f'способ записи, можно указать несколько раз (по умолчанию {DEFAULT_WRITER})')
+    parser.add_argument('--batch-size', action='append', type=int, help=f'по умолчанию {BATCH_SIZE}')
+    parser.add_argument('--workers', action='append', type=int, help='по умолчанию 1')
+    parser.add_argument('--read-workers', action='append', type=int,
+                        help='процессов чтения одной таблицы SQLite, по умолчанию 1')
+    parser.add_argument('--repeat', type=int, default=1, help='количество прогонов каждой комбинации')
+    parser.add_argument('--output', default='benchmark.json', help='файл для результатов')
+    parser.add_argument('--compare', help='файл с результатами прошлого запуска')
+    args = parser.parse_args()
+
+    load_dotenv()
+    dsl = {'dbname': os.environ.get('DB_NAME'), 'user': os.environ.get('DB_USER'),
+           'password': os.environ.get('DB_PASSWORD'), 'host': os.environ.get('DB_HOST'),
+           'port': os.environ.get('DB_PORT')}
+
+    runs = []
+    for writer, batch_size, workers, read_workers in product(
+            args.writer or [DEFAULT_WRITER], args.batch_size or [BATCH_SIZE], args.workers or [1],
+            args.read_workers or [1]):
+        options = LoadOptions(batch_size=batch_size, writer_backend=writer, workers=workers,
+                              read_workers=read_workers)
+        for _ in range(args.repeat):
+            run = run_in_subprocess(args.sqlite, dsl, options)
+            print(f"{writer} batch={batch_size} workers={workers} read_workers={read_workers}: "
+                  f"{run['rows']} строк за {run['seconds']} с, "
+                  f"{run['rows_per_second']} rows/s, пиковый RSS {run['peak_rss_kb']} КБ")
+            for table, table_run in run['tables'].items():
+                print(f"  {table}: {table_run['rows']} строк за {table_run['seconds']} с")
+            runs.append(run)
+
+    result = {
+        'loader_version': get_loader_version(),
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'python': sys.version.split()[0],
+        'sqlite': os.path.abspath(args.sqlite),
+        'sqlite_rows': count_sqlite_rows(args.sqlite),
+        'runs': runs,
+    }
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(result, file, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        compare(runs, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,357 @@
+"""
+Blue/green полная перезагрузка: данные загружаются в UNLOGGED-таблицы схемы content_staging без индексов
+и ограничений, затем индексы строятся параллельно, и готовые таблицы одной короткой транзакцией
+переносятся в content. Читатели всё это время видят прежние данные.
+
+Индексы, ограничения и триггеры не описываются здесь заново, а копируются с живых таблиц content
+(pg_get_indexdef, pg_get_constraintdef, pg_get_triggerdef): схема остаётся единственной - из миграций Django и DDL.
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass, field
+from functools import partial
+
+import psycopg2
+from dead_letter import DEAD_LETTER_PATH, DeadLetterLog
+from psycopg2.extensions import quote_ident
+from writers import PG_SCHEMA
+
+STAGING_SCHEMA = 'content_staging'
+OLD_SCHEMA = 'content_old'
+LOCK_TIMEOUT = '5s'
+
+DEPENDENTS_SQL = """
+    SELECT DISTINCT dependent.oid::regclass::text
+    FROM pg_depend
+    JOIN pg_rewrite ON pg_rewrite.oid = pg_depend.objid
+    JOIN pg_class dependent ON dependent.oid = pg_rewrite.ev_class
+    WHERE pg_depend.classid = 'pg_rewrite'::regclass
+        AND pg_depend.refobjid = ANY(%(tables)s::regclass[]) AND dependent.oid <> ALL(%(tables)s::regclass[])
+    UNION
+    SELECT DISTINCT conrelid::regclass::text
+    FROM pg_constraint
+    WHERE contype = 'f' AND confrelid = ANY(%(tables)s::regclass[]) AND conrelid <> ALL(%(tables)s::regclass[])
+"""
+
+
+@dataclass
+class TableDefinition:
+    """
+    Индексы, ограничения и триггеры живой таблицы, переписанные на staging-схему.
+    unique_keys - колонки уникальных индексов, кроме первичного ключа: list[tuple(имя индекса, list[str])]
+    """
+    table: str
+    indexes: list = field(default_factory=list)
+    unique_keys: list = field(default_factory=list)
+    constraints: list = field(default_factory=list)
+    foreign_keys: list = field(default_factory=list)
+    triggers: list = field(default_factory=list)
+
+
+def _to_staging(sql, table):
+    """
+    @param sql: str - определение из pg_get_*def, имена в нём квалифицированы схемой
+    @param table: str
+    @return: str
+    """
+    live, staging = f' ON {PG_SCHEMA}.{table} ', f' ON {STAGING_SCHEMA}.{table} '
+    if live not in sql:
+        raise ValueError(f'Не удалось перенести на {STAGING_SCHEMA} определение: {sql}')
+    return sql.replace(live, staging, 1)
+
+
+def get_table_definition(pg_cursor, table):
+    """
+    search_path должен быть пустым (pg_catalog), чтобы pg_get_*def квалифицировали все имена схемой
+    @param pg_cursor: cursor_object
+    @param table: str
+    @return: TableDefinition
+    """
+    definition = TableDefinition(table)
+    staging = f'{STAGING_SCHEMA}.{table}'
+    pg_cursor.execute("""
+        SELECT index_class.relname, pg_get_indexdef(pg_index.indexrelid),
+               pg_constraint.conname, pg_constraint.contype, pg_constraint.condeferrable, pg_constraint.condeferred,
+               CASE WHEN pg_index.indisunique AND NOT pg_index.indisprimary AND pg_index.indpred IS NULL
+                    AND 0 <> ALL(pg_index.indkey) THEN ARRAY(
+                   SELECT attname FROM pg_attribute
+                   WHERE attrelid = pg_index.indrelid AND attnum = ANY(pg_index.indkey) ORDER BY attnum
+               ) END
+        FROM pg_index
+        JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid
+        LEFT JOIN pg_constraint ON pg_constraint.conindid = pg_index.indexrelid
+            AND pg_constraint.conrelid = pg_index.indrelid AND pg_constraint.contype IN ('p', 'u')
+        WHERE pg_index.indrelid = %s::regclass
+        ORDER BY index_class.relname
+        """, (f'{PG_SCHEMA}.{table}',))
+    for index_name, index_sql, constraint_name, constraint_type, deferrable, deferred, key in pg_cursor.fetchall():
+        definition.indexes.append((index_name, _to_staging(index_sql, table)))
+        if key:
+            definition.unique_keys.append((index_name, key))
+        if constraint_name is None:
+            continue
+        kind = 'PRIMARY KEY' if constraint_type == 'p' else 'UNIQUE'
+        deferral = ' DEFERRABLE INITIALLY DEFERRED' if deferred else ' DEFERRABLE' if deferrable else ''
+        definition.constraints.append((constraint_name, (
+            f'ALTER TABLE {staging} ADD CONSTRAINT {quote_ident(constraint_name, pg_cursor)} '
+            f'{kind} USING INDEX {quote_ident(index_name, pg_cursor)}{deferral}'
+        )))
+
+    pg_cursor.execute("""
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype = 'f'
+        ORDER BY conname
+        """, (f'{PG_SCHEMA}.{table}',))
+    for constraint_name, constraint_sql in pg_cursor.fetchall():
+        constraint_sql = constraint_sql.replace(f' REFERENCES {PG_SCHEMA}.', f' REFERENCES {STAGING_SCHEMA}.')
+        definition.foreign_keys.append((constraint_name, (
+            f'ALTER TABLE {staging} ADD CONSTRAINT {quote_ident(constraint_name, pg_cursor)} {constraint_sql}'
+        )))
+
+    pg_cursor.execute("""
+        SELECT pg_get_triggerdef(oid) FROM pg_trigger
+        WHERE tgrelid = %s::regclass AND NOT tgisinternal
+        ORDER BY tgname
+        """, (f'{PG_SCHEMA}.{table}',))
+    definition.triggers = [_to_staging(trigger_sql, table) for trigger_sql, in pg_cursor.fetchall()]
+    return definition
+
+
+def get_table_definitions(pg_conn, tables):
+    """
+    @param pg_conn: connection_object
+    @param tables: list[str]
+    @return: dict{table: TableDefinition}
+    """
+    with pg_conn.cursor() as cursor:
+        cursor.execute("SET search_path TO pg_catalog")
+        definitions = {table: get_table_definition(cursor, table) for table in tables}
+        cursor.execute("RESET search_path")
+    return definitions
+
+
+def staging_schema_exists(dsl):
+    """
+    @param dsl: dict
+    @return: bool
+    """
+    with closing(psycopg2.connect(**dsl)) as pg_conn, pg_conn.cursor() as cursor:
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_namespace WHERE nspname = %s)", (STAGING_SCHEMA,))
+        return cursor.fetchone()[0]
+
+
+def create_staging_schema(dsl, tables):
+    """
+    Пересоздаёт content_staging: UNLOGGED-копии таблиц content с колонками, DEFAULT, NOT NULL и CHECK,
+    но без индексов и внешних ключей. Триггеры копируются сразу, чтобы вычисляемые ими колонки
+    (search_vector фильмов) заполнялись при загрузке так же, как в живой таблице.
+    @param dsl: dict
+    @param tables: list[str]
+    """
+    with closing(psycopg2.connect(**dsl)) as pg_conn:
+        definitions = get_table_definitions(pg_conn, tables)
+        with pg_conn.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {STAGING_SCHEMA} CASCADE")
+            cursor.execute(f"CREATE SCHEMA {STAGING_SCHEMA}")
+            for table in tables:
+                cursor.execute(f"""
+                    CREATE UNLOGGED TABLE {STAGING_SCHEMA}.{table}
+                    (LIKE {PG_SCHEMA}.{table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+                    """)
+                for trigger_sql in definitions[table].triggers:
+                    cursor.execute(trigger_sql)
+        pg_conn.commit()
+
+
+def _execute(dsl, sql):
+    """
+    Отдельная задача пула: своё подключение, чтобы команды выполнялись на сервере одновременно
+    @param dsl: dict
+    @param sql: str
+    """
+    with closing(psycopg2.connect(**dsl)) as pg_conn:
+        pg_conn.autocommit = True
+        with pg_conn.cursor() as cursor:
+            cursor.execute(sql)
+
+
+def _run_parallel(dsl, statements, workers):
+    """
+    @param dsl: dict
+    @param statements: list[str]
+    @param workers: int
+    """
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        list(executor.map(partial(_execute, dsl), statements))
+
+
+def _report(message, enabled):
+    if enabled:
+        sys.stderr.write(f'{message}\n')
+        sys.stderr.flush()
+
+
+def remove_duplicate_keys(dsl, definition, dead_letter_path=DEAD_LETTER_PATH, source_table=None):
+    """
+    Строки staging с тем же значением уникального ключа, что и у строки, загруженной раньше (например,
+    связь фильма и персоны с той же ролью под другим id). В staging нет ограничений, поэтому такие строки
+    загружаются, а уникальный индекс на них не построится. Они удаляются и дописываются в dead_letter_path,
+    как строки, которые загрузчик не смог записать в content
+    @param dsl: dict
+    @param definition: TableDefinition
+    @param dead_letter_path: str
+    @param source_table: str | None - имя таблицы для dead_letter_path, по умолчанию имя в PG
+    @return: int - удалено строк
+    """
+    table, removed = definition.table, 0
+    dead_letter_log = DeadLetterLog(dead_letter_path)
+    with closing(psycopg2.connect(**dsl)) as pg_conn:
+        with pg_conn.cursor() as cursor:
+            for index_name, key in definition.unique_keys:
+                cursor.execute(f"""
+                    DELETE FROM {STAGING_SCHEMA}.{table} AS duplicate USING {STAGING_SCHEMA}.{table} AS kept
+                    WHERE {' AND '.join(f'duplicate.{column} = kept.{column}' for column in key)}
+                        AND duplicate.ctid > kept.ctid
+                    RETURNING duplicate.*
+                    """)
+                field_names = [column[0] for column in cursor.description]
+                error = f'{index_name}: повтор ({", ".join(key)})'
+                rows = cursor.fetchall()
+                dead_letter_log.write(source_table or table, field_names, [(row, error) for row in rows])
+                removed += len(rows)
+        pg_conn.commit()
+    return removed
+
+
+def finalize_staging(dsl, tables, workers=1, deduplicate=False, progress=True, dead_letter_path=DEAD_LETTER_PATH,
+                     source_tables=None):
+    """
+    Готовит загруженные таблицы staging к переключению. Каждый шаг пропускает уже сделанное,
+    поэтому после сбоя финализацию можно просто запустить ещё раз.
+    1. deduplicate - удалить повторы id: при продолжении после сбоя последняя пачка могла записаться дважды.
+       Повторы уникальных ключей с другими id переносятся в dead_letter_path (remove_duplicate_keys).
+    2. SET LOGGED - таблица переписывается в WAL один раз целиком, пока на ней нет индексов.
+    3. Индексы строятся параллельно в workers подключениях, самые большие таблицы - первыми.
+    4. Первичные ключи и уникальные ограничения - по уже построенным индексам (USING INDEX), без повторного построения.
+    5. Внешние ключи: при добавлении Postgres проверяет все строки, это и есть проверка ссылочной целостности.
+    6. ANALYZE, чтобы у планировщика была статистика сразу после переключения.
+    @param dsl: dict
+    @param tables: list[str]
+    @param workers: int
+    @param deduplicate: bool
+    @param progress: bool - выводить время шагов в stderr
+    @param dead_letter_path: str
+    @param source_tables: dict{table: str} | None - имена таблиц в источнике для dead_letter_path
+    @return: dict{table: int} - строк, удалённых как повторы уникальных ключей
+    """
+    with closing(psycopg2.connect(**dsl)) as pg_conn:
+        definitions = get_table_definitions(pg_conn, tables)
+        with pg_conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT relname, pg_relation_size(oid) FROM pg_class
+                WHERE relnamespace = %s::regnamespace AND relkind = 'r'
+                """, (STAGING_SCHEMA,))
+            sizes = dict(cursor.fetchall())
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE schemaname = %s", (STAGING_SCHEMA,))
+            existing = {name for name, in cursor.fetchall()}
+            cursor.execute("""
+                SELECT conname FROM pg_constraint
+                WHERE connamespace = %s::regnamespace AND contype IN ('p', 'u', 'f')
+                """, (STAGING_SCHEMA,))
+            existing.update(name for name, in cursor.fetchall())
+        pg_conn.commit()
+    tables = sorted(tables, key=lambda table: sizes.get(table, 0), reverse=True)
+
+    started = time.perf_counter()
+    if deduplicate:
+        _run_parallel(dsl, [
+            f"""
+            DELETE FROM {STAGING_SCHEMA}.{table} AS duplicate USING {STAGING_SCHEMA}.{table} AS original
+            WHERE duplicate.id = original.id AND duplicate.ctid > original.ctid
+            """
+            for table in tables
+        ], workers)
+    # Если уникальные индексы уже построены, повторов нет
+    pending = [table for table in tables
+               if any(index_name not in existing for index_name, _ in definitions[table].unique_keys)]
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        removed = dict(zip(pending, executor.map(
+            lambda table: remove_duplicate_keys(dsl, definitions[table], dead_letter_path,
+                                                (source_tables or {}).get(table)),
+            pending,
+        )))
+    _run_parallel(dsl, [f"ALTER TABLE {STAGING_SCHEMA}.{table} SET LOGGED" for table in tables], workers)
+    _report(f'{STAGING_SCHEMA}: SET LOGGED за {time.perf_counter() - started:.1f} с', progress)
+
+    started = time.perf_counter()
+    _run_parallel(dsl, [
+        index_sql
+        for table in tables
+        for index_name, index_sql in definitions[table].indexes
+        if index_name not in existing
+    ], workers)
+    _report(f'{STAGING_SCHEMA}: индексы за {time.perf_counter() - started:.1f} с', progress)
+
+    started = time.perf_counter()
+    with closing(psycopg2.connect(**dsl)) as pg_conn:
+        with pg_conn.cursor() as cursor:
+            for table in tables:
+                for constraint_name, constraint_sql in definitions[table].constraints:
+                    if constraint_name not in existing:
+                        cursor.execute(constraint_sql)
+            pg_conn.commit()
+            # Внешние ключи на одну таблицу конфликтуют по блокировкам, поэтому добавляются последовательно
+            for table in tables:
+                for constraint_name, constraint_sql in definitions[table].foreign_keys:
+                    if constraint_name not in existing:
+                        cursor.execute(constraint_sql)
+                        pg_conn.commit()
+    _report(f'{STAGING_SCHEMA}: ограничения за {time.perf_counter() - started:.1f} с', progress)
+
+    _run_parallel(dsl, [f"ANALYZE {STAGING_SCHEMA}.{table}" for table in tables], workers)
+    return removed
+
+
+def swap_schemas(dsl, expected_rows, lock_timeout=LOCK_TIMEOUT):
+    """
+    Проверка и переключение одной транзакцией: количество строк в staging сверяется с источником,
+    затем живые таблицы переносятся в content_old, а таблицы staging - в content.
+    Блокировка живых таблиц берётся только на время переноса (ALTER TABLE ... SET SCHEMA меняет
+    лишь каталог), lock_timeout не даёт переключению бесконечно ждать долгих запросов и блокировать
+    всех, кто встал в очередь за ним. Старые таблицы удаляются уже после коммита.
+    @param dsl: dict
+    @param expected_rows: dict{table: int} - количество строк в SQLite без пропущенных загрузчиком
+    @param lock_timeout: str
+    """
+    tables = list(expected_rows)
+    live_tables = [f'{PG_SCHEMA}.{table}' for table in tables]
+    with closing(psycopg2.connect(**dsl)) as pg_conn:
+        with pg_conn.cursor() as cursor:
+            # Представления и внешние ключи других таблиц остались бы ссылаться на старые таблицы и удалились бы с ними
+            cursor.execute(DEPENDENTS_SQL, {'tables': live_tables})
+            dependents = [name for name, in cursor.fetchall()]
+            if dependents:
+                raise ValueError(f'На таблицы {PG_SCHEMA} ссылаются другие объекты: {", ".join(dependents)}')
+            for table, expected in expected_rows.items():
+                cursor.execute(f"SELECT COUNT(*) FROM {STAGING_SCHEMA}.{table}")
+                rows = cursor.fetchone()[0]
+                if rows != expected:
+                    raise ValueError(f'{STAGING_SCHEMA}.{table}: {rows} строк, в источнике {expected}')
+
+            cursor.execute("SET LOCAL lock_timeout = %s", (lock_timeout,))
+            cursor.execute(f"DROP SCHEMA IF EXISTS {OLD_SCHEMA} CASCADE")
+            cursor.execute(f"CREATE SCHEMA {OLD_SCHEMA}")
+            cursor.execute(f"LOCK TABLE {', '.join(live_tables)} IN ACCESS EXCLUSIVE MODE")
+            for table in tables:
+                cursor.execute(f"ALTER TABLE {PG_SCHEMA}.{table} SET SCHEMA {OLD_SCHEMA}")
+            for table in tables:
+                cursor.execute(f"ALTER TABLE {STAGING_SCHEMA}.{table} SET SCHEMA {PG_SCHEMA}")
+        pg_conn.commit()
+
+        with pg_conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {', '.join(f'{OLD_SCHEMA}.{table}' for table in tables)}")
+            cursor.execute(f"DROP SCHEMA {OLD_SCHEMA}")
+            cursor.execute(f"DROP SCHEMA {STAGING_SCHEMA}")
+        pg_conn.commit()
@@ -0,0 +1,71 @@
+"""
+Строки, которые не удалось записать: неверная дата, full_name длиннее поля модели, недопустимый type.
+Пачка с ошибкой делится пополам, пока ошибочные строки не останутся по одной; они пишутся в файл
+вместе с текстом ошибки, а остальные строки пачки коммитятся. Одна плохая строка в пачке из n стоит
+около 2 * log2(n) дополнительных запросов, а не перезапуска загрузки.
+"""
+import psycopg2
+from integrity import OrphanLog
+
+DEAD_LETTER_PATH = 'dead_letter.jsonl'
+
+# Ошибки, которые вызывают сами строки, а не подключение или запрос: при них пачка делится.
+# ValueError и TypeError - ошибки кодирования значений на стороне Python (бинарный COPY)
+ROW_ERRORS = (psycopg2.DataError, psycopg2.IntegrityError, ValueError, TypeError)
+
+
+class DeadLetterLog(OrphanLog):
+    """Отклонённые строки в JSON Lines: таблица, строка и текст ошибки"""
+    detail_key = 'error'
+
+
+def get_error_message(error):
+    """
+    @param error: Exception
+    @return: str - первая строка сообщения Postgres или текст исключения Python
+    """
+    message = getattr(error, 'pgerror', None) or str(error) or type(error).__name__
+    return message.strip().splitlines()[0]
+
+
+def validate_choices(data, choices):
+    """
+    Проверка значений, которые ограничены choices моделей Django, а не базой: Postgres запишет
+    любой type, поэтому такие строки отклоняются до записи
+    @param data: list[tuple]
+    @param choices: tuple[tuple(int, str, tuple)] - позиция поля, имя поля и допустимые значения
+    @return: tuple(list[tuple], list[tuple(tuple, str)]) - подходящие строки и отклонённые с ошибкой
+    """
+    if not choices:
+        return data, []
+    valid, rejected = [], []
+    for row in data:
+        errors = [f'{name}: недопустимое значение {row[position]!r}'
+                  for position, name, allowed in choices if row[position] not in allowed]
+        if errors:
+            rejected.append((row, '; '.join(errors)))
+        else:
+            valid.append(row)
+    return valid, rejected
+
+
+def write_batch(writer, pg_conn, data, payload=None):
+    """
+    Записывает и коммитит пачку. Если пачка не записалась из-за своих строк, транзакция откатывается,
+    и половины пачки записываются так же, каждая своим коммитом
+    @param writer: writers.Writer
+    @param pg_conn: connection_object
+    @param data: list[tuple]
+    @param payload: результат writer.encode(data), если уже закодирована
+    @return: list[tuple(tuple, str)] - строки, которые записать не удалось, и ошибки
+    """
+    try:
+        writer.send(writer.encode(data) if payload is None else payload)
+        pg_conn.commit()
+        return []
+    except ROW_ERRORS as error:
+        pg_conn.rollback()
+        if len(data) == 1:
+            return [(data[0], get_error_message(error))]
+    middle = len(data) // 2
+    return write_batch(writer, pg_conn, data[:middle]) + write_batch(writer, pg_conn, data[middle:])
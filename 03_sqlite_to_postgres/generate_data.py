@@ -0,0 +1,197 @@
+"""
+Генератор db.sqlite с той же схемой из пяти таблиц для нагрузочных тестов загрузчика.
+
+Запуск: python generate_data.py --film-works 100000 --output bench.sqlite
+
+Данные детерминированы (--seed) и генерируются потоково: id вычисляются из номера строки,
+поэтому память не зависит от масштаба, и 10 млн фильмов генерируются так же, как 10 тысяч.
+"""
+import argparse
+import hashlib
+import os
+import random
+import sqlite3
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from itertools import islice
+
+SCHEMA = """
+CREATE TABLE film_work (
+    id TEXT PRIMARY KEY, title TEXT NOT NULL, description TEXT, creation_date DATE, file_path TEXT,
+    rating FLOAT, type TEXT NOT NULL, created timestamp with time zone, modified timestamp with time zone
+);
+CREATE TABLE genre (
+    id TEXT PRIMARY KEY, name TEXT NOT NULL, description TEXT,
+    created timestamp with time zone, modified timestamp with time zone
+);
+CREATE TABLE person (
+    id TEXT PRIMARY KEY, full_name TEXT NOT NULL,
+    created timestamp with time zone, modified timestamp with time zone
+);
+CREATE TABLE genre_film_work (
+    id TEXT PRIMARY KEY, film_work_id TEXT NOT NULL, genre_id TEXT NOT NULL,
+    created timestamp with time zone
+);
+CREATE TABLE person_film_work (
+    id TEXT PRIMARY KEY, film_work_id TEXT NOT NULL, person_id TEXT NOT NULL, role TEXT NOT NULL,
+    created timestamp with time zone
+);
+CREATE UNIQUE INDEX film_work_person ON person_film_work (film_work_id, person_id);
+CREATE UNIQUE INDEX film_work_genre ON genre_film_work (film_work_id, genre_id);
+"""
+
+GENRES = (
+    'Action', 'Adventure', 'Animation', 'Biography', 'Comedy', 'Crime', 'Documentary', 'Drama', 'Family',
+    'Fantasy', 'Film-Noir', 'History', 'Horror', 'Music', 'Musical', 'Mystery', 'News', 'Reality-TV',
+    'Romance', 'Sci-Fi', 'Short', 'Sport', 'Talk-Show', 'Thriller', 'War', 'Western',
+)
+WORDS = (
+    'star', 'wars', 'return', 'night', 'empire', 'last', 'dark', 'city', 'love', 'story', 'lost', 'king',
+    'secret', 'world', 'galaxy', 'journey', 'shadow', 'river', 'fire', 'dream', 'legend', 'time', 'war',
+)
+FIRST_NAMES = ('George', 'Mark', 'Harrison', 'Carrie', 'Peter', 'Anthony', 'Kenny', 'Alec', 'Natalie', 'Ewan')
+LAST_NAMES = ('Lucas', 'Hamill', 'Ford', 'Fisher', 'Cushing', 'Daniels', 'Baker', 'Guinness', 'Portman')
+
+# Количество людей каждой роли на фильм: (минимум, максимум)
+CAST = {'director': (1, 2), 'writer': (1, 3), 'actor': (3, 10)}
+PERSONS_PER_FILM_WORK = 1.5
+GENRES_PER_FILM_WORK = (1, 3)
+CHUNK_SIZE = 10_000
+EPOCH = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+
+def make_id(seed, kind, number):
+    """
+    Детерминированный uuid4 по номеру строки: не нужно хранить id родительских таблиц в памяти
+    @param seed: int
+    @param kind: str
+    @param number: int
+    @return: str
+    """
+    return str(uuid.UUID(bytes=hashlib.md5(f'{seed}:{kind}:{number}'.encode()).digest(), version=4))
+
+
+def make_timestamp(rnd):
+    """
+    @param rnd: random.Random
+    @return: str - в формате SQLite-выгрузки, '2021-06-16 20:14:09.221855+00'
+    """
+    moment = EPOCH + timedelta(seconds=rnd.randrange(365 * 24 * 3600), microseconds=rnd.randrange(10 ** 6))
+    return moment.strftime('%Y-%m-%d %H:%M:%S.%f+00')
+
+
+def zipf_index(rnd, size):
+    """
+    Популярные персоны снимаются чаще: индекс с убывающей вероятностью
+    @param rnd: random.Random
+    @param size: int
+    @return: int
+    """
+    return min(int(size * rnd.random() ** 3), size - 1)
+
+
+def generate_genres(seed):
+    rnd = random.Random(f'{seed}:genre')
+    for number, name in enumerate(GENRES):
+        created = make_timestamp(rnd)
+        yield make_id(seed, 'genre', number), name, None, created, created
+
+
+def generate_persons(seed, count):
+    rnd = random.Random(f'{seed}:person')
+    for number in range(count):
+        created = make_timestamp(rnd)
+        full_name = f'{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}'
+        yield make_id(seed, 'person', number), full_name, created, created
+
+
+def generate_film_works(seed, count):
+    rnd = random.Random(f'{seed}:film_work')
+    for number in range(count):
+        created = make_timestamp(rnd)
+        title = ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(1, 4))).capitalize()
+        description = ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(10, 60))) if rnd.random() < 0.9 else None
+        creation_date = (date(1950, 1, 1) + timedelta(days=rnd.randrange(70 * 365))).isoformat() \
+            if rnd.random() < 0.8 else None
+        rating = round(rnd.uniform(0, 10), 1) if rnd.random() < 0.9 else None
+        film_type = 'movie' if rnd.random() < 0.8 else 'tv_show'
+        yield make_id(seed, 'film_work', number), title, description, creation_date, None, rating, film_type, \
+            created, created
+
+
+def generate_genre_film_works(seed, film_works):
+    rnd = random.Random(f'{seed}:genre_film_work')
+    for number in range(film_works):
+        film_work_id = make_id(seed, 'film_work', number)
+        for genre in rnd.sample(range(len(GENRES)), rnd.randint(*GENRES_PER_FILM_WORK)):
+            yield make_id(seed, 'genre_film_work', f'{number}:{genre}'), film_work_id, \
+                make_id(seed, 'genre', genre), make_timestamp(rnd)
+
+
+def generate_person_film_works(seed, film_works, persons):
+    rnd = random.Random(f'{seed}:person_film_work')
+    for number in range(film_works):
+        film_work_id = make_id(seed, 'film_work', number)
+        cast = set()
+        for role, (minimum, maximum) in CAST.items():
+            # (film_work_id, person_id) уникальны, как в исходной SQLite: одна роль на человека в фильме
+            role_cast = {zipf_index(rnd, persons) for _ in range(rnd.randint(minimum, maximum))} - cast
+            cast |= role_cast
+            for person in role_cast:
+                yield make_id(seed, 'person_film_work', f'{number}:{role}:{person}'), film_work_id, \
+                    make_id(seed, 'person', person), role, make_timestamp(rnd)
+
+
+def insert(connection, table, rows):
+    """
+    Вставка пачками по CHUNK_SIZE строк
+    @param connection: sqlite3.Connection
+    @param table: str
+    @param rows: generator[tuple]
+    @return: int
+    """
+    count = 0
+    rows = iter(rows)
+    while chunk := list(islice(rows, CHUNK_SIZE)):
+        connection.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(chunk[0]))})", chunk)
+        count += len(chunk)
+    connection.commit()
+    return count
+
+
+def generate(path, film_works, seed=0, overwrite=False):
+    """
+    @param path: str
+    @param film_works: int
+    @param seed: int
+    @param overwrite: bool - пересоздать файл, если он уже есть
+    @return: dict{table: количество строк}
+    """
+    if os.path.exists(path):
+        if not overwrite:
+            raise FileExistsError(f'{path} уже существует, используйте --force, чтобы перезаписать')
+        os.remove(path)
+    persons = max(1, int(film_works * PERSONS_PER_FILM_WORK))
+    with sqlite3.connect(path) as connection:
+        connection.execute('PRAGMA journal_mode = OFF')
+        connection.execute('PRAGMA synchronous = OFF')
+        connection.executescript(SCHEMA)
+        return {
+            'genre': insert(connection, 'genre', generate_genres(seed)),
+            'person': insert(connection, 'person', generate_persons(seed, persons)),
+            'film_work': insert(connection, 'film_work', generate_film_works(seed, film_works)),
+            'genre_film_work': insert(connection, 'genre_film_work', generate_genre_film_works(seed, film_works)),
+            'person_film_work': insert(connection, 'person_film_work',
+                                       generate_person_film_works(seed, film_works, persons)),
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Генерация SQLite-базы для нагрузочных тестов загрузчика')
+    parser.add_argument('--film-works', type=int, default=10_000, help='количество фильмов')
+    parser.add_argument('--output', default='bench.sqlite', help='путь к создаваемому файлу')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--force', action='store_true', help='перезаписать существующий файл')
+    args = parser.parse_args()
+    for table, count in generate(args.output, args.film_works, args.seed, args.force).items():
+        print(f'{table}: {count}')
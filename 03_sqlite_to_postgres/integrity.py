@@ -0,0 +1,212 @@
+"""
+Проверка ссылочной целостности при загрузке: id родительских таблиц (film_work, person, genre) собираются
+в памяти, пока их строки проходят через загрузчик, и строки таблиц связей проверяются по ним пачками,
+без запросов к Postgres.
+
+id хранятся как 16 байт, а не как str: 65536 корзин по первым двум байтам, корзина - bytearray из подряд
+идущих id. На id приходится 16 байт плюс около 4 МБ на корзины - примерно в шесть раз меньше, чем set строк,
+а поиск - это bytearray.find по корзине из N / 65536 id, который выполняется в C. Поиск в несколько раз
+медленнее, чем в set, но пачка проверяется одним вызовом contains_many, а Postgres не получает ни одного запроса.
+"""
+import json
+import uuid
+
+BUCKETS = 1 << 16
+UUID_SIZE = 16
+ORPHANS_PATH = 'orphans.jsonl'
+
+# quarantine - строки с несуществующими ссылками не загружаются и пишутся в ORPHANS_PATH,
+# report - загружаются, но тоже пишутся в ORPHANS_PATH, off - проверки нет
+INTEGRITY_MODES = ('quarantine', 'report', 'off')
+
+
+def uuid_bytes(value):
+    """
+    @param value: str | uuid.UUID
+    @return: bytes | None - None, если value не UUID
+    """
+    if isinstance(value, uuid.UUID):
+        return value.bytes
+    try:
+        key = bytes.fromhex(value.replace('-', ''))
+    except (AttributeError, ValueError):
+        return None
+    return key if len(key) == UUID_SIZE else None
+
+
+class UuidSet:
+    """Множество UUID по 16 байт, см. описание модуля"""
+
+    def __init__(self, values=()):
+        """
+        @param values: iterable[str | uuid.UUID]
+        """
+        self.buckets = [bytearray() for _ in range(BUCKETS)]
+        self.size = 0
+        self.update(values)
+
+    @staticmethod
+    def _bucket_index(key):
+        return key[0] << 8 | key[1]
+
+    def _find(self, key):
+        """
+        @param key: bytes
+        @return: tuple(bytearray, int) - корзина и смещение id в ней, -1 - если id нет
+        """
+        bucket = self.buckets[self._bucket_index(key)]
+        position = bucket.find(key)
+        # Совпадение может начаться посреди соседних id, такие пропускаем
+        while position > 0 and position % UUID_SIZE:
+            position = bucket.find(key, position + 1)
+        return bucket, position
+
+    def add(self, value):
+        """
+        @param value: str | uuid.UUID
+        """
+        self.update((value,))
+
+    def update(self, values):
+        """
+        Повторы не проверяются: id родительской таблицы уникальны. Значения, не являющиеся UUID, пропускаются
+        @param values: iterable[str | uuid.UUID]
+        """
+        buckets = self.buckets
+        for value in values:
+            key = uuid_bytes(value)
+            if key is not None:
+                buckets[key[0] << 8 | key[1]] += key
+                self.size += 1
+
+    def discard(self, value):
+        """
+        @param value: str | uuid.UUID
+        """
+        key = uuid_bytes(value)
+        if key is None:
+            return
+        bucket, position = self._find(key)
+        if position != -1:
+            del bucket[position:position + UUID_SIZE]
+            self.size -= 1
+
+    def contains_many(self, values):
+        """
+        Проверка пачки одним вызовом: корзины и append берутся из локальных переменных
+        @param values: iterable[str | uuid.UUID]
+        @return: list[bool]
+        """
+        buckets = self.buckets
+        result = []
+        append = result.append
+        for value in values:
+            key = uuid_bytes(value)
+            if key is None:
+                append(False)
+                continue
+            bucket = buckets[key[0] << 8 | key[1]]
+            position = bucket.find(key)
+            while position > 0 and position % UUID_SIZE:
+                position = bucket.find(key, position + 1)
+            append(position != -1)
+        return result
+
+    def __contains__(self, value):
+        return self.contains_many((value,))[0]
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        """
+        @return: int - байт, занятых id (без учёта объектов корзин)
+        """
+        return sum(len(bucket) for bucket in self.buckets)
+
+
+class IntegrityIndex:
+    """id родительских таблиц, по которым проверяются ссылки таблиц связей"""
+
+    def __init__(self):
+        self.ids = {}
+        self.complete = set()
+
+    def collector(self, table):
+        """
+        Пустое множество, которое загрузчик заполняет, пока переносит таблицу целиком
+        @param table: str
+        @return: UuidSet
+        """
+        self.ids[table] = UuidSet()
+        self.complete.discard(table)
+        return self.ids[table]
+
+    def mark_complete(self, table):
+        """
+        @param table: str
+        """
+        self.complete.add(table)
+
+    def get(self, table, read_ids):
+        """
+        Если таблица не проходила через загрузчик целиком в этом процессе (инкрементальная загрузка,
+        продолжение после сбоя, параллельная загрузка), её id дочитываются read_ids
+        @param table: str
+        @param read_ids: function() -> iterable[str | uuid.UUID] - id уже загруженных строк таблицы
+        @return: UuidSet
+        """
+        if table not in self.complete:
+            self.collector(table).update(read_ids())
+            self.mark_complete(table)
+        return self.ids[table]
+
+
+def find_orphans(data, references):
+    """
+    @param data: list[tuple]
+    @param references: list[tuple(int, str, UuidSet)] - позиция поля со ссылкой, имя поля и id родительской таблицы
+    @return: tuple(list[tuple], list[tuple(tuple, dict)]) - строки с существующими ссылками
+        и строки-сироты вместе с {поле: id} ссылок, которых нет
+    """
+    valid, orphans = [], []
+    masks = [
+        (position, name, ids.contains_many([row[position] for row in data]))
+        for position, name, ids in references
+    ]
+    for number, row in enumerate(data):
+        missing = {name: row[position] for position, name, mask in masks if not mask[number]}
+        if missing:
+            orphans.append((row, missing))
+        else:
+            valid.append(row)
+    return valid, orphans
+
+
+class OrphanLog:
+    """Строки-сироты в JSON Lines: таблица, строка и отсутствующие ссылки"""
+    detail_key = 'missing'
+
+    def __init__(self, path=ORPHANS_PATH):
+        """
+        @param path: str
+        """
+        self.path = path
+
+    def write(self, table, field_names, orphans):
+        """
+        Пачка дописывается одной записью в конец файла, поэтому параллельные процессы не перемешивают строки
+        @param table: str
+        @param field_names: tuple[str]
+        @param orphans: list[tuple(tuple, detail)] - строки и то, что записывается под ключом detail_key
+        """
+        if not orphans:
+            return
+        lines = ''.join(
+            json.dumps({'table': table, 'row': dict(zip(field_names, row)), self.detail_key: detail},
+                       ensure_ascii=False, default=str) + '\n'
+            for row, detail in orphans
+        )
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.write(lines)
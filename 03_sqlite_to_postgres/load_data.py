@@ -1,112 +1,691 @@
+import cProfile
 import os
 import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass, field, fields
+from functools import partial
 
 import psycopg2
+from blue_green import (LOCK_TIMEOUT, STAGING_SCHEMA, create_staging_schema,
+                        finalize_staging, staging_schema_exists, swap_schemas)
+from dead_letter import (DEAD_LETTER_PATH, DeadLetterLog, validate_choices,
+                         write_batch)
 from dotenv import load_dotenv
+from integrity import (INTEGRITY_MODES, ORPHANS_PATH, IntegrityIndex,
+                       OrphanLog, find_orphans)
+from metrics import Progress, StageTimer, build_summary, save_summary
+from pipeline import PIPELINE_DEPTH, run_pipeline
 from psycopg2.extensions import connection as _connection
 from psycopg2.extras import DictCursor
+from readers import MMAP_SIZE, ParallelReader, iter_table, open_sqlite
+from state import CheckpointState, WatermarkState
 from table_objects import (Filmwork, Genre, GenreFilmwork, Person,
-                           PersonFilmWork)
+                           PersonFilmWork, RowMapper)
+from writers import DEFAULT_WRITER, PG_SCHEMA, get_writer
 
+BATCH_SIZE = 1000
+SQLITE_PATH = 'db.sqlite'
+WATERMARKS_PATH = 'watermarks.json'
+CHECKPOINT_DIR = 'checkpoints'
+METRICS_PATH = 'metrics.json'
 
-def get_data_from_table(table, cursor):
+
+@dataclass(frozen=True)
+class LoadOptions:
+    """Настройки загрузки, по умолчанию - полная перезагрузка одним процессом"""
+    batch_size: int = BATCH_SIZE
+    writer_backend: str = DEFAULT_WRITER
+    workers: int = 1
+    read_workers: int = 1
+    read_ordered: bool = True
+    sqlite_mmap_size: int = MMAP_SIZE
+    pipeline_depth: int = PIPELINE_DEPTH
+    integrity: str = 'quarantine'
+    orphans_path: str = ORPHANS_PATH
+    dead_letter_path: str = DEAD_LETTER_PATH
+    incremental: bool = False
+    blue_green: bool = False
+    swap_lock_timeout: str = LOCK_TIMEOUT
+    watermarks_path: str = WATERMARKS_PATH
+    checkpoint_dir: str = CHECKPOINT_DIR
+    progress: bool = True
+
+    @property
+    def mode(self):
+        """
+        @return: str - режим загрузки в терминах LOAD_MODE: full, incremental или bluegreen
+        """
+        if self.blue_green:
+            return 'bluegreen'
+        return 'incremental' if self.incremental else 'full'
+
+    def __post_init__(self):
+        if self.integrity not in INTEGRITY_MODES:
+            raise ValueError(f'Неизвестный режим проверки ссылок {self.integrity}, '
+                             f'доступны: {", ".join(INTEGRITY_MODES)}')
+
+    @classmethod
+    def from_env(cls):
+        """
+        @return: LoadOptions
+        """
+        return cls(
+            batch_size=int(os.environ.get('BATCH_SIZE', BATCH_SIZE)),
+            writer_backend=os.environ.get('PG_WRITER', DEFAULT_WRITER),
+            workers=int(os.environ.get('WORKERS', 1)),
+            read_workers=int(os.environ.get('READ_WORKERS', 1)),
+            read_ordered=os.environ.get('READ_ORDERED', 'TRUE').upper() == 'TRUE',
+            sqlite_mmap_size=int(os.environ.get('SQLITE_MMAP_SIZE') or MMAP_SIZE),
+            pipeline_depth=int(os.environ.get('PIPELINE_DEPTH') or PIPELINE_DEPTH),
+            integrity=(os.environ.get('INTEGRITY_CHECK') or 'quarantine').lower(),
+            orphans_path=os.environ.get('ORPHANS_PATH') or ORPHANS_PATH,
+            dead_letter_path=os.environ.get('DEAD_LETTER_PATH') or DEAD_LETTER_PATH,
+            incremental=os.environ.get('LOAD_MODE', 'full').lower() == 'incremental',
+            blue_green=os.environ.get('LOAD_MODE', 'full').lower() == 'bluegreen',
+            swap_lock_timeout=os.environ.get('SWAP_LOCK_TIMEOUT') or LOCK_TIMEOUT,
+            watermarks_path=os.environ.get('WATERMARKS_PATH', WATERMARKS_PATH),
+            checkpoint_dir=os.environ.get('CHECKPOINT_DIR', CHECKPOINT_DIR),
+            progress=os.environ.get('PROGRESS', 'TRUE').upper() == 'TRUE',
+        )
+
+
+@dataclass
+class TableStats:
+    """
+    Итог загрузки таблицы: stages - время по этапам из metrics.STAGES,
+    queues - заполненность очередей конвейера (metrics.QueueStats.as_dict),
+    orphans - строк со ссылками на несуществующие id, dead_letters - строк, отклонённых при записи,
+    skipped - прочитанных, но не записанных строк
+    """
+    rows: int = 0
+    seconds: float = 0.0
+    watermark: str = None
+    batches: int = 0
+    stages: dict = field(default_factory=dict)
+    queues: dict = field(default_factory=dict)
+    orphans: int = 0
+    dead_letters: int = 0
+    skipped: int = 0
+
+    @classmethod
+    def from_checkpoint(cls, progress, since=None):
+        """
+        @param progress: dict - контрольная точка таблицы, см. as_checkpoint
+        @param since: str | None - watermark прошлого запуска
+        @return: TableStats
+        """
+        return cls(progress.get('rows', 0), watermark=progress.get('watermark', since),
+                   orphans=progress.get('orphans', 0), dead_letters=progress.get('dead_letters', 0),
+                   skipped=progress.get('skipped', 0))
+
+    def add_batch(self, size, written, orphans, dead_letters, watermark):
+        """
+        @param size: int - прочитано строк
+        @param written: int - записано строк
+        @param orphans: int
+        @param dead_letters: int
+        @param watermark: str | None - максимальная отметка времени пачки
+        """
+        self.rows += size
+        self.batches += 1
+        self.orphans += orphans
+        self.dead_letters += dead_letters
+        self.skipped += size - written
+        if self.watermark is None or (watermark is not None and watermark > self.watermark):
+            self.watermark = watermark
+
+    def as_checkpoint(self, last_rowid, done=False):
+        """
+        @param last_rowid: int
+        @param done: bool
+        @return: dict
+        """
+        return {'last_rowid': last_rowid, 'rows': self.rows, 'watermark': self.watermark,
+                'orphans': self.orphans, 'dead_letters': self.dead_letters, 'skipped': self.skipped, 'done': done}
+
+
+@dataclass(frozen=True)
+class TableMigration:
+    """Описание переноса одной таблицы: откуда читаем, куда и какие поля пишем"""
+    sqlite_table: str
+    pg_table: str
+    table: type
+    fields: tuple
+    columns: tuple
+    watermark_field: str
+    version_column: str = field(default=None)
+    depends_on: tuple = field(default=())
+    choices: tuple = field(default=())
+
+    @property
+    def references(self):
+        """
+        Поля со ссылками на родительские таблицы: имя поля совпадает с именем таблицы в depends_on
+        @return: tuple[tuple(int, str)] - позиция поля в fields и таблица SQLite
+        """
+        return tuple((self.fields.index(parent), parent) for parent in self.depends_on)
+
+    @property
+    def choice_checks(self):
+        """
+        @return: tuple[tuple(int, str, tuple)] - позиция поля в fields, имя поля и допустимые значения
+        """
+        return tuple((self.fields.index(name), name, allowed) for name, allowed in self.choices)
+
+    def get_watermark_column(self, sqlite_cursor):
+        """
+        Колонки SQLite сопоставляются полям dataclass по порядку (как в RowMapper.positional),
+        поэтому имя колонки с отметкой времени берём по позиции поля
+        @param sqlite_cursor: cursor_object
+        @return: str
+        """
+        position = [table_field.name for table_field in fields(self.table)].index(self.watermark_field)
+        sqlite_cursor.execute(f"PRAGMA table_info({self.sqlite_table})")
+        return sqlite_cursor.fetchall()[position][1]
+
+
+# Порядок важен: таблицы связей загружаются после таблиц, на которые ссылаются
+MIGRATIONS = (
+    TableMigration('person', 'person', Person,
+                   ('id', 'full_name', 'created', 'modified'),
+                   ('id', 'full_name', 'created', 'modified'),
+                   watermark_field='modified', version_column='modified'),
+    TableMigration('film_work', 'filmwork', Filmwork,
+                   ('id', 'title', 'description', 'creation_date', 'rating', 'type', 'created', 'modified'),
+                   ('id', 'title', 'description', 'creation_date', 'rating', 'type', 'created', 'modified'),
+                   watermark_field='modified', version_column='modified',
+                   choices=(('type', ('movie', 'tv_show')),)),
+    TableMigration('genre', 'genre', Genre,
+                   ('id', 'name', 'description'),
+                   ('id', 'name', 'description'),
+                   watermark_field='updated'),
+    TableMigration('person_film_work', 'person_filmwork', PersonFilmWork,
+                   ('id', 'film_work', 'person', 'role', 'created'),
+                   ('id', 'film_work_id', 'person_id', 'role', 'created'),
+                   watermark_field='created', depends_on=('person', 'film_work'),
+                   choices=(('role', ('writer', 'actor', 'director')),)),
+    TableMigration('genre_film_work', 'genre_filmwork', GenreFilmwork,
+                   ('id', 'film_work', 'genre', 'created'),
+                   ('id', 'film_work_id', 'genre_id', 'created'),
+                   watermark_field='created', depends_on=('genre', 'film_work')),
+)
+
+MIGRATIONS_BY_TABLE = {migration.sqlite_table: migration for migration in MIGRATIONS}
+REFERENCED_TABLES = {parent for migration in MIGRATIONS for parent in migration.depends_on}
+
+
+def get_migration_stages(migrations=MIGRATIONS):
+    """
+    Разбивает таблицы на этапы: таблицы одного этапа не зависят друг от друга
+    и могут загружаться одновременно, этап начинается после завершения всех предыдущих
+    @param migrations: tuple[TableMigration]
+    @return: list[list[TableMigration]]
     """
+    stages = []
+    done = set()
+    pending = list(migrations)
+    while pending:
+        stage = [migration for migration in pending if done.issuperset(migration.depends_on)]
+        if not stage:
+            raise ValueError(f'Циклическая зависимость между таблицами: {[m.sqlite_table for m in pending]}')
+        stages.append(stage)
+        done.update(migration.sqlite_table for migration in stage)
+        pending = [migration for migration in pending if migration not in stage]
+    return stages
+
+
+def get_batches_by_rowid(table, cursor, batch_size=BATCH_SIZE, after=0, where='', params=()):
+    """
+    Постраничное чтение по rowid: каждая страница - отдельный запрос WHERE rowid > последнего прочитанного,
+    поэтому чтение можно продолжить с любого места без повторного прохода по таблице
     @param table: str
     @param cursor: cursor_object
-    @return: generator
+    @param batch_size: int
+    @param after: int - rowid, после которого начинать чтение
+    @param where: str - дополнительное условие отбора с плейсхолдерами ?
+    @param params: tuple
+    @return: generator[tuple(int, list[tuple])] - rowid последней строки пачки и строки (rowid - первая колонка)
     """
-    cursor.execute(f"SELECT * FROM {table}")
+    condition = f'rowid > ? AND ({where})' if where else 'rowid > ?'
     while True:
-        results = cursor.fetchmany(1000)
+        cursor.execute(f"SELECT rowid, * FROM {table} WHERE {condition} ORDER BY rowid LIMIT ?",
+                       (after, *params, batch_size))
+        results = cursor.fetchall()
         if not results:
             break
-        for result in results:
-            yield result
+        after = results[-1][0]
+        yield after, results
 
 
-def fill_dataclass(data, table):
+def get_sqlite_path(sqlite_cursor):
     """
-    @param data: generator
-    @param table: class
-    @return: list[class_objects]
+    @param sqlite_cursor: cursor_object
+    @return: str - файл основной базы подключения, по нему открываются подключения процессов чтения
     """
-    result = []
-    for columns in data:
-        fields = {
-            Person: ['id', 'full_name', 'created', 'modified'],
-            GenreFilmwork: ['id', 'film_work', 'genre', 'created'],
-            Genre: ['id', 'name', 'description', 'created', 'updated'],
-            PersonFilmWork: ['id', 'film_work', 'person', 'role', 'created'],
-            Filmwork: ['id', 'title', 'description', 'creation_date',
-                       'file_path', 'rating', 'type', 'created', 'modified']
-        }
-        Table = table()
-        for column_data in columns:
-            field_name = fields[table].pop(0)
-            setattr(Table, field_name, column_data)
-        result.append(Table)
+    sqlite_cursor.execute("PRAGMA database_list")
+    return next(path for _, name, path in sqlite_cursor.fetchall() if name == 'main')
 
-    return result
 
+def get_batch_source(migration, sqlite_cursor, options, last_rowid, max_rowid, where='', params=()):
+    """
+    @param migration: TableMigration
+    @param sqlite_cursor: cursor_object
+    @param options: LoadOptions
+    @param last_rowid: int - rowid, после которого начинать чтение
+    @param max_rowid: int | None
+    @param where: str
+    @param params: tuple
+    @return: iterable[tuple(int, list[tuple])] - пачки, как в get_batches_by_rowid
+    """
+    # Маленькие таблицы быстрее прочитать одним запросом, чем запускать процессы
+    if options.read_workers > 1 and (max_rowid or 0) - last_rowid > options.batch_size * options.read_workers:
+        return ParallelReader(get_sqlite_path(sqlite_cursor), migration.sqlite_table, options.batch_size,
+                              options.read_workers, options.read_ordered, last_rowid, where, params,
+                              options.sqlite_mmap_size)
+    if options.pipeline_depth > 0:
+        # Подключение SQLite нельзя использовать из другого потока, поэтому поток чтения открывает своё
+        return iter_table(get_sqlite_path(sqlite_cursor), migration.sqlite_table, options.batch_size, last_rowid,
+                          max_rowid or 0, where, params, options.sqlite_mmap_size)
+    return get_batches_by_rowid(migration.sqlite_table, sqlite_cursor, options.batch_size, last_rowid, where, params)
 
-def execute_migration(table, columns, data, pg_cursor):
+
+def read_table_ids(pg_conn, table, schema, batch_size):
+    """
+    id загруженной таблицы читаются из Postgres, а не из SQLite: строки, которые загрузчик не записал
+    (недопустимые choices, ошибки записи), туда не попали, и ссылки на них тоже считаются сиротами
+    @param pg_conn: connection_object
+    @param table: str - таблица Postgres
+    @param schema: str
+    @param batch_size: int
+    @return: generator[str]
+    """
+    with pg_conn.cursor(name=f'{table}_ids') as cursor:
+        cursor.itersize = batch_size
+        cursor.execute(f"SELECT id FROM {schema}.{table}")
+        for row in cursor:
+            yield row[0]
+    pg_conn.commit()
+
+
+def get_integrity_checks(migration, pg_conn, options, integrity, collect, schema=PG_SCHEMA):
+    """
+    Родительские таблицы к этому моменту загружены: в одном процессе - раньше по MIGRATIONS,
+    в нескольких - на предыдущем этапе get_migration_stages
+    @param migration: TableMigration
+    @param pg_conn: connection_object
+    @param options: LoadOptions
+    @param integrity: IntegrityIndex
+    @param collect: bool - таблица переносится целиком, её id можно собрать на лету
+    @param schema: str - схема, в которую загружаются таблицы
+    @return: tuple(list[tuple(int, str, UuidSet)], UuidSet | None) - проверяемые ссылки
+        и множество, в которое собираются id таблицы
+    """
+    if options.integrity == 'off':
+        return [], None
+    references = []
+    for position, parent in migration.references:
+        read_ids = partial(read_table_ids, pg_conn, MIGRATIONS_BY_TABLE[parent].pg_table, schema, options.batch_size)
+        references.append((position, parent, integrity.get(parent, read_ids)))
+    if not collect or migration.sqlite_table not in REFERENCED_TABLES:
+        return references, None
+    return references, integrity.collector(migration.sqlite_table)
+
+
+class BatchTransform:
+    """
+    Этап конвейера между чтением и записью: строки SQLite -> кортежи для записи, проверка choices и ссылок,
+    кодирование
+    """
+
+    def __init__(self, migration, mapper, writer, timer, references=(), collected_ids=None, quarantine=True):
+        """
+        @param migration: TableMigration
+        @param mapper: RowMapper
+        @param writer: writers.Writer
+        @param timer: StageTimer
+        @param references: list[tuple(int, str, UuidSet)] - см. get_integrity_checks
+        @param collected_ids: UuidSet | None
+        @param quarantine: bool - не записывать строки-сироты
+        """
+        self.to_output = mapper.output(migration.fields)
+        self.choices = migration.choice_checks
+        self.get_watermark = mapper.getter(migration.watermark_field)
+        self.writer = writer
+        self.timer = timer
+        self.references = references
+        self.collected_ids = collected_ids
+        self.quarantine = quarantine
+
+    def __call__(self, item):
+        """
+        @param item: tuple(int, list[tuple]) - rowid и пачка строк SQLite
+        @return: tuple(int, int, str | None, payload | None, list, list, list) - rowid, размер пачки,
+            watermark пачки, данные для send (None - не закодированы), записываемые строки,
+            строки-сироты и строки с недопустимыми значениями
+        """
+        batch_rowid, batch = item
+        with self.timer('map'):
+            data = list(map(self.to_output, batch))
+            batch_watermark = max(filter(None, map(self.get_watermark, batch)), default=None)
+            data, rejected = validate_choices(data, self.choices)
+        with self.timer('integrity'):
+            data, orphans = self.check(data)
+        return batch_rowid, len(batch), batch_watermark, self.encode(data), data, orphans, rejected
+
+    def encode(self, data):
+        """
+        @param data: list[tuple]
+        @return: payload | None - None, если writer кодирует в потоке записи или пачку закодировать не удалось
+        """
+        if not self.writer.concurrent_encode or not data:
+            return None
+        with self.timer('encode'):
+            try:
+                return self.writer.encode(data)
+            except (ValueError, TypeError):
+                # Строку с ошибкой найдёт write_batch
+                return None
+
+    def check(self, data):
+        """
+        @param data: list[tuple]
+        @return: tuple(list[tuple], list[tuple(tuple, dict)]) - записываемые строки и строки-сироты
+        """
+        orphans = []
+        if self.references:
+            valid, orphans = find_orphans(data, self.references)
+            if self.quarantine:
+                data = valid
+        if self.collected_ids is not None:
+            self.collected_ids.update(row[0] for row in data)
+        return data, orphans
+
+
+def write_rows(writer, pg_conn, data, payload, timer, collected_ids=None):
+    """
+    @param writer: writers.Writer
+    @param pg_conn: connection_object
+    @param data: list[tuple]
+    @param payload: закодированная пачка из BatchTransform или None
+    @param timer: StageTimer
+    @param collected_ids: UuidSet | None - из него убираются id строк, которые не удалось записать
+    @return: list[tuple(tuple, str)] - строки, которые не удалось записать, и ошибки (см. dead_letter.write_batch)
+    """
+    if not data:
+        return []
+    with timer('execute'):
+        failed = write_batch(writer, pg_conn, data, payload)
+    if collected_ids is not None:
+        for row, _ in failed:
+            collected_ids.discard(row[0])
+    return failed
+
+
+def get_checkpoint_source(sqlite_path, options):
+    """
+    @param sqlite_path: str
+    @param options: LoadOptions
+    @return: dict - файл SQLite, время его изменения и режим загрузки, к которым относятся контрольные точки
+    """
+    sqlite_path = os.path.abspath(sqlite_path)
+    return {'sqlite': sqlite_path, 'mtime': os.stat(sqlite_path).st_mtime_ns, 'mode': options.mode}
+
+
+def start_or_resume(sqlite_path, options):
+    """
+    Контрольные точки другого файла SQLite или другого режима удаляются, а не продолжаются
+    @param sqlite_path: str
+    @param options: LoadOptions
+    @return: bool - True, если продолжается прерванная загрузка того же файла в том же режиме
+    """
+    if CheckpointState.exists(options.checkpoint_dir, get_checkpoint_source(sqlite_path, options)):
+        return True
+    CheckpointState.clear(options.checkpoint_dir)
+    return False
+
+
+def migrate_table(migration, sqlite_cursor, pg_conn, options=LoadOptions(), since=None, schema=PG_SCHEMA,
+                  integrity=None):
+    """
+    Переносит таблицу пачками через конвейер (pipeline.run_pipeline): чтение, преобразование и запись
+    выполняются одновременно, в памяти находится не больше 2 * pipeline_depth + 3 пачек.
+    Каждая пачка коммитится отдельно, после коммита в контрольную точку записывается rowid последней
+    строки, и при повторном запуске таблица дочитывается с этого места. Если упасть между коммитом
+    и записью контрольной точки, пачка запишется ещё раз - это безопасно, запись идемпотентна.
+    Если передан since, читаются только строки, изменённые не раньше него, и существующие
+    в Postgres строки обновляются. Строки с отметкой, равной since, перечитываются:
+    upsert идемпотентен, а строки, добавленные в ту же микросекунду, не теряются.
+    Ссылки строк таблиц связей проверяются по id родительских таблиц в integrity (см. integrity.py):
+    в режиме quarantine строки-сироты не записываются, в обоих режимах они дописываются в options.orphans_path.
+    Строки, которые не удалось записать, и строки с недопустимыми type и role не останавливают загрузку:
+    они дописываются в options.dead_letter_path (см. dead_letter.py), остальные строки пачки коммитятся.
+    @param migration: TableMigration
+    @param sqlite_cursor: cursor_object
+    @param pg_conn: connection_object
+    @param options: LoadOptions
+    @param since: str | None - watermark прошлого запуска
+    @param schema: str - в staging-схеме blue/green загрузки нет первичных ключей, строки только добавляются
+    @param integrity: IntegrityIndex | None - общий для таблиц одного процесса, None - собрать заново
+    @return: TableStats - количество перенесённых строк (вместе с загруженными до перезапуска) и новый watermark
+    """
+    started = time.perf_counter()
+    checkpoint = CheckpointState(options.checkpoint_dir, migration.sqlite_table,
+                                 get_checkpoint_source(get_sqlite_path(sqlite_cursor), options))
+    progress = checkpoint.load()
+    stats = TableStats.from_checkpoint(progress, since)
+    if progress.get('done'):
+        return stats
+
+    writer = get_writer(options.writer_backend, pg_conn.cursor(), migration.pg_table, migration.columns,
+                        upsert=options.incremental, version_column=migration.version_column,
+                        schema=schema, on_conflict=schema == PG_SCHEMA)
+    # Временная таблица CopyWriter должна пережить откат пачки с ошибкой
+    pg_conn.commit()
+    where, params = '', ()
+    if since is not None:
+        where, params = f'{migration.get_watermark_column(sqlite_cursor)} >= ?', (since,)
+
+    timer = StageTimer()
+    sqlite_cursor.execute(f"SELECT MAX(rowid) FROM {migration.sqlite_table}")
+    max_rowid = sqlite_cursor.fetchone()[0]
+    report = Progress(migration.sqlite_table, max_rowid, enabled=options.progress)
+    count, last_rowid = stats.rows, progress.get('last_rowid', 0)
+    sqlite_cursor.execute(f"SELECT rowid, * FROM {migration.sqlite_table} LIMIT 0")
+    mapper = RowMapper.positional(migration.table, sqlite_cursor.description)
+    batches = get_batch_source(migration, sqlite_cursor, options, last_rowid, max_rowid, where, params)
+
+    integrity = integrity if integrity is not None else IntegrityIndex()
+    references, collected_ids = get_integrity_checks(migration, pg_conn, options, integrity,
+                                                     collect=since is None and not last_rowid, schema=schema)
+    transform = BatchTransform(migration, mapper, writer, timer, references, collected_ids,
+                               quarantine=options.integrity == 'quarantine')
+    orphan_log, dead_letter_log = OrphanLog(options.orphans_path), DeadLetterLog(options.dead_letter_path)
+
+    queues = {}
+    for last_rowid, batch_size, batch_watermark, payload, data, orphans, rejected in run_pipeline(
+            timer.iterate('read', batches), transform, options.pipeline_depth, queues):
+        failed = write_rows(writer, pg_conn, data, payload, timer, collected_ids)
+        orphan_log.write(migration.sqlite_table, migration.fields, orphans)
+        dead_letter_log.write(migration.sqlite_table, migration.fields, rejected + failed)
+        stats.add_batch(batch_size, len(data) - len(failed), len(orphans), len(rejected) + len(failed),
+                        batch_watermark)
+        with timer('checkpoint'):
+            checkpoint.save(stats.as_checkpoint(last_rowid))
+        report.update(stats.rows - count, last_rowid)
+
+    checkpoint.save(stats.as_checkpoint(last_rowid, done=True))
+    report.update(stats.rows - count, last_rowid, force=True)
+    if collected_ids is not None:
+        integrity.mark_complete(migration.sqlite_table)
+    stats.seconds, stats.stages = time.perf_counter() - started, timer.as_dict()
+    stats.queues = {name: queue_stats.as_dict() for name, queue_stats in queues.items()}
+    return stats
+
+
+def truncate_tables(pg_cursor):
     """
-    @param table: str
-    @param columns: str
-    @param data: list[tuple(str)]
     @param pg_cursor: cursor_object
     """
-    format_symbols = '%s, ' * len(columns.split(','))
-    args = ','.join(pg_cursor.mogrify(f"({format_symbols[:-2]})", item).decode() for item in data)
-    sql = (f"""
-        INSERT INTO content.{table} ({columns})
-        VALUES {args}
-        ON CONFLICT (id) DO NOTHING
-        """)
-    pg_cursor.execute(sql)
+    pg_cursor.execute("""TRUNCATE content.person, content.filmwork, content.genre CASCADE""")
 
 
-def load_from_sqlite(connection: sqlite3.Connection, pg_conn: _connection):
-    """Основной метод загрузки данных из SQLite в Postgres"""
+def load_from_sqlite(connection: sqlite3.Connection, pg_conn: _connection, options: LoadOptions = LoadOptions()):
+    """
+    Основной метод загрузки данных из SQLite в Postgres.
+    Полная загрузка очищает таблицы и переносит всё, инкрементальная - только строки новее
+    сохранённых watermark. Watermark сохраняются в обоих режимах после завершения загрузки.
+    Если остались контрольные точки прерванного запуска того же файла в том же режиме, загрузка продолжается с них.
+    @return: dict{table: TableStats}
+    """
     sqlite_cursor = connection.cursor()
-    persons = fill_dataclass(get_data_from_table('person', sqlite_cursor), Person)
-    genres = fill_dataclass(get_data_from_table('genre', sqlite_cursor), Genre)
-    film_works = fill_dataclass(get_data_from_table('film_work', sqlite_cursor), Filmwork)
-    person_film_works = fill_dataclass(get_data_from_table('person_film_work', sqlite_cursor), PersonFilmWork)
-    genre_film_works = fill_dataclass(get_data_from_table('genre_film_work', sqlite_cursor), GenreFilmwork)
+    watermark_state = WatermarkState(options.watermarks_path)
+    watermarks = watermark_state.load() if options.incremental else {}
+
+    if not start_or_resume(get_sqlite_path(sqlite_cursor), options) and not options.incremental:
+        truncate_tables(pg_conn.cursor())
+        pg_conn.commit()
+
+    stats = {}
+    integrity = IntegrityIndex()
+    for migration in MIGRATIONS:
+        stats[migration.sqlite_table] = migrate_table(
+            migration, sqlite_cursor, pg_conn, options, watermarks.get(migration.sqlite_table), integrity=integrity
+        )
+        watermarks[migration.sqlite_table] = stats[migration.sqlite_table].watermark
+
     sqlite_cursor.close()
+    watermark_state.update(watermarks)
+    CheckpointState.clear(options.checkpoint_dir)
+    return stats
 
-    pg_cursor = pg_conn.cursor()
 
-    pg_cursor.execute("""TRUNCATE content.person, content.filmwork, content.genre CASCADE""")
+def load_table(sqlite_table, sqlite_path, dsl, options=LoadOptions(), watermark=None, schema=PG_SCHEMA):
+    """
+    Загрузка одной таблицы в отдельном процессе со своими подключениями к обеим базам
+    @param sqlite_table: str
+    @param sqlite_path: str
+    @param dsl: dict
+    @param options: LoadOptions
+    @param watermark: str | None
+    @param schema: str
+    @return: TableStats
+    """
+    migration = MIGRATIONS_BY_TABLE[sqlite_table]
+    with closing(open_sqlite(sqlite_path, options.sqlite_mmap_size)) as sqlite_conn, \
+            closing(psycopg2.connect(**dsl)) as pg_conn:
+        return migrate_table(migration, sqlite_conn.cursor(), pg_conn, options, watermark, schema)
+
 
-    # Person
-    data = [(item.id, item.full_name, item.created, item.modified) for item in persons]
-    columns = 'id, full_name, created, modified'
-    execute_migration('Person', columns, data, pg_cursor)
+def load_from_sqlite_parallel(sqlite_path: str, dsl: dict, options: LoadOptions = LoadOptions()):
+    """
+    Параллельная загрузка: независимые таблицы грузятся одновременно в пуле из options.workers процессов,
+    таблицы связей - только после того, как таблицы, на которые они ссылаются, закоммичены.
+    @return: dict{table: TableStats}
+    """
+    watermark_state = WatermarkState(options.watermarks_path)
+    watermarks = watermark_state.load() if options.incremental else {}
+
+    if not start_or_resume(sqlite_path, options) and not options.incremental:
+        with closing(psycopg2.connect(**dsl)) as pg_conn:
+            truncate_tables(pg_conn.cursor())
+            pg_conn.commit()
 
-    # Filmwork
-    data = [(item.id, item.title, item.description, item.creation_date,
-             item.rating, item.type, item.created, item.modified) for item in film_works]
-    columns = 'id, title, description, creation_date, rating, type, created, modified'
-    execute_migration('filmwork', columns, data, pg_cursor)
+    stats = {}
+    with ProcessPoolExecutor(max_workers=options.workers) as executor:
+        for stage in get_migration_stages():
+            futures = {
+                migration.sqlite_table: executor.submit(
+                    load_table, migration.sqlite_table, sqlite_path, dsl, options,
+                    watermarks.get(migration.sqlite_table),
+                )
+                for migration in stage
+            }
+            for sqlite_table, future in futures.items():
+                stats[sqlite_table] = future.result()
+                watermarks[sqlite_table] = stats[sqlite_table].watermark
+            watermark_state.update(watermarks)
+    CheckpointState.clear(options.checkpoint_dir)
+    return stats
 
-    # Genre
-    data = [(item.id, item.name, item.description) for item in genres]
-    columns = 'id, name, description'
-    execute_migration('genre', columns, data, pg_cursor)
 
-    # Person_filmwork
-    data = [(item.id, item.film_work, item.person, item.role, item.created) for item in person_film_works]
-    columns = 'id, film_work_id, person_id, role, created'
-    execute_migration('person_filmwork', columns, data, pg_cursor)
+def add_removed_duplicates(stats, removed, sqlite_path, options):
+    """
+    Повторы уникальных ключей, которые finalize_staging убрал из staging, считаются отклонёнными строками.
+    Они сохраняются и в контрольные точки: после сбоя повторов в staging уже нет, а сверка
+    количества строк с SQLite должна их учесть
+    @param stats: dict{table: TableStats}
+    @param removed: dict{pg_table: int}
+    @param sqlite_path: str
+    @param options: LoadOptions
+    """
+    source = get_checkpoint_source(sqlite_path, options)
+    for migration in MIGRATIONS:
+        duplicates = removed.get(migration.pg_table, 0)
+        if not duplicates:
+            continue
+        table_stats = stats[migration.sqlite_table]
+        table_stats.dead_letters += duplicates
+        table_stats.skipped += duplicates
+        checkpoint = CheckpointState(options.checkpoint_dir, migration.sqlite_table, source)
+        checkpoint.save({**checkpoint.load(), 'dead_letters': table_stats.dead_letters,
+                         'skipped': table_stats.skipped})
+
 
-    # Genre_filmwork
-    data = [(item.id, item.film_work, item.genre, item.created) for item in genre_film_works]
-    columns = 'id, film_work_id, genre_id, created'
-    execute_migration('genre_filmwork', columns, data, pg_cursor)
+def load_blue_green(sqlite_path: str, dsl: dict, options: LoadOptions = LoadOptions()):
+    """
+    Полная перезагрузка без простоя чтения: все таблицы загружаются в staging-схему (при options.workers > 1
+    этапами, как в load_from_sqlite_parallel: внешних ключей там нет, но ссылки таблиц связей проверяются
+    по id, уже записанным в staging, иначе ссылка на отклонённый фильм сорвёт добавление внешнего ключа),
+    затем на них строятся индексы и ограничения, и после сверки количества строк с SQLite
+    таблицы подменяют живые в content.
+    Если загрузка прервалась, повторный запуск продолжает её в той же staging-схеме.
+    @return: dict{table: TableStats}
+    """
+    watermark_state = WatermarkState(options.watermarks_path)
+    tables = [migration.pg_table for migration in MIGRATIONS]
+    resumed = start_or_resume(sqlite_path, options) and staging_schema_exists(dsl)
+    if not resumed:
+        CheckpointState.clear(options.checkpoint_dir)
+        create_staging_schema(dsl, tables)
+
+    if options.workers > 1:
+        stats = {}
+        with ProcessPoolExecutor(max_workers=options.workers) as executor:
+            for stage in get_migration_stages():
+                futures = {
+                    migration.sqlite_table: executor.submit(
+                        load_table, migration.sqlite_table, sqlite_path, dsl, options, schema=STAGING_SCHEMA,
+                    )
+                    for migration in stage
+                }
+                stats.update((sqlite_table, future.result()) for sqlite_table, future in futures.items())
+    else:
+        integrity = IntegrityIndex()
+        with closing(open_sqlite(sqlite_path, options.sqlite_mmap_size)) as sqlite_conn, \
+                closing(psycopg2.connect(**dsl)) as pg_conn:
+            stats = {
+                migration.sqlite_table: migrate_table(migration, sqlite_conn.cursor(), pg_conn, options,
+                                                      schema=STAGING_SCHEMA, integrity=integrity)
+                for migration in MIGRATIONS
+            }
+
+    removed = finalize_staging(dsl, tables, options.workers, deduplicate=resumed, progress=options.progress,
+                               dead_letter_path=options.dead_letter_path,
+                               source_tables={migration.pg_table: migration.sqlite_table for migration in MIGRATIONS})
+    add_removed_duplicates(stats, removed, sqlite_path, options)
+    with closing(open_sqlite(sqlite_path, options.sqlite_mmap_size)) as sqlite_conn:
+        expected_rows = {
+            migration.pg_table: sqlite_conn.execute(f"SELECT COUNT(*) FROM {migration.sqlite_table}").fetchone()[0]
+            - stats[migration.sqlite_table].skipped
+            for migration in MIGRATIONS
+        }
+    swap_schemas(dsl, expected_rows, options.swap_lock_timeout)
 
-    connection.commit()
+    watermark_state.update({sqlite_table: table_stats.watermark for sqlite_table, table_stats in stats.items()})
+    CheckpointState.clear(options.checkpoint_dir)
+    return stats
 
 
 if __name__ == '__main__':
@@ -114,5 +693,26 @@ if __name__ == '__main__':
     dsl = {'dbname': os.environ.get('DB_NAME'), 'user': os.environ.get('DB_USER'),
            'password': os.environ.get('DB_PASSWORD'), 'host': os.environ.get('DB_HOST'),
            'port': os.environ.get('DB_PORT')}
-    with sqlite3.connect('db.sqlite') as sqlite_conn, psycopg2.connect(**dsl, cursor_factory=DictCursor) as pg_conn:
-        load_from_sqlite(sqlite_conn, pg_conn)
+    options = LoadOptions.from_env()
+    sqlite_path = os.environ.get('SQLITE_PATH', SQLITE_PATH)
+    # При параллельной загрузке профилируется только основной процесс
+    profile_path = os.environ.get('PROFILE_PATH')
+    profiler = cProfile.Profile() if profile_path else None
+    if profiler:
+        profiler.enable()
+    load_started = time.perf_counter()
+    if options.blue_green:
+        stats = load_blue_green(sqlite_path, dsl, options)
+    elif options.workers > 1:
+        stats = load_from_sqlite_parallel(sqlite_path, dsl, options)
+    else:
+        with closing(open_sqlite(sqlite_path, options.sqlite_mmap_size)) as sqlite_conn, \
+                psycopg2.connect(**dsl, cursor_factory=DictCursor) as pg_conn:
+            stats = load_from_sqlite(sqlite_conn, pg_conn, options)
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(profile_path)
+    summary = build_summary(stats, time.perf_counter() - load_started)
+    save_summary(os.environ.get('METRICS_PATH', METRICS_PATH), summary)
+    print(f"Загружено {summary['rows']} строк за {summary['seconds']} с ({summary['rows_per_second']} строк/с), "
+          f"больше всего времени заняло: {summary['bottleneck']}")
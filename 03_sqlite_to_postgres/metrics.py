@@ -0,0 +1,177 @@
+import json
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+PROGRESS_INTERVAL = 1.0
+
+# Этапы загрузки пачки в порядке выполнения
+STAGES = ('read', 'map', 'integrity', 'encode', 'execute', 'checkpoint')
+
+
+class StageTimer:
+    """Суммарное время по этапам загрузки одной таблицы"""
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+
+    @contextmanager
+    def __call__(self, stage):
+        """
+        with timer('map'): ...
+        @param stage: str
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] += time.perf_counter() - started
+
+    def iterate(self, stage, iterable):
+        """
+        Время ожидания каждого следующего элемента итератора относится к stage.
+        Если генератор закрыли раньше времени, закрывается и iterable - в том же потоке
+        @param stage: str
+        @param iterable: iterable
+        @return: generator
+        """
+        iterator = iter(iterable)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    self.seconds[stage] += time.perf_counter() - started
+                    return
+                self.seconds[stage] += time.perf_counter() - started
+                yield item
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+
+    def as_dict(self):
+        """
+        @return: dict{stage: seconds}
+        """
+        return {stage: round(self.seconds[stage], 6) for stage in STAGES if stage in self.seconds}
+
+
+class QueueStats:
+    """
+    Заполненность очереди между этапами конвейера. Долгое ожидание put (очередь полна) значит,
+    что следующий этап не успевает, долгое ожидание get (очередь пуста) - что не успевает предыдущий
+    """
+
+    def __init__(self, size):
+        """
+        @param size: int - ёмкость очереди
+        """
+        self.size = size
+        self.samples = 0
+        self.total_depth = 0
+        self.max_depth = 0
+        self.put_wait = 0.0
+        self.get_wait = 0.0
+
+    def observe(self, depth):
+        """
+        @param depth: int - элементов в очереди в момент put
+        """
+        self.samples += 1
+        self.total_depth += depth
+        self.max_depth = max(self.max_depth, depth)
+
+    def as_dict(self):
+        """
+        @return: dict
+        """
+        return {
+            'size': self.size,
+            'average_depth': round(self.total_depth / self.samples, 2) if self.samples else 0,
+            'max_depth': self.max_depth,
+            'put_wait': round(self.put_wait, 3),
+            'get_wait': round(self.get_wait, 3),
+        }
+
+
+class Progress:
+    """Строка прогресса таблицы в stderr не чаще раза в interval секунд: строки, rows/s, ETA"""
+
+    def __init__(self, table, total_position, interval=PROGRESS_INTERVAL, stream=None, enabled=True):
+        """
+        @param table: str
+        @param total_position: int - максимальный rowid таблицы, по нему считается доля пройденного
+        @param interval: float
+        @param stream: file_object
+        @param enabled: bool
+        """
+        self.table = table
+        self.total_position = total_position or 0
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.enabled = enabled
+        self.started = self.last_report = time.perf_counter()
+
+    def update(self, rows, position, force=False):
+        """
+        @param rows: int - строк перенесено в этом запуске
+        @param position: int - rowid последней перенесённой строки
+        @param force: bool - вывести, даже если interval не прошёл
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if not force and now - self.last_report < self.interval:
+            return
+        self.last_report = now
+        elapsed = now - self.started
+        rate = rows / elapsed if elapsed else 0
+        done = min(position / self.total_position, 1.0) if self.total_position else 1.0
+        eta = f'{elapsed * (1 - done) / done:.0f} с' if done else '?'
+        self.stream.write(f'{self.table}: {rows} строк, {done:.1%}, {rate:.0f} строк/с, осталось {eta}\n')
+        self.stream.flush()
+
+
+def build_summary(stats, seconds):
+    """
+    @param stats: dict{table: load_data.TableStats}
+    @param seconds: float - общее время загрузки
+    @return: dict - итоговые метрики: по таблицам, по этапам и самый долгий этап
+    """
+    stages = defaultdict(float)
+    tables = {}
+    for table, table_stats in stats.items():
+        for stage, stage_seconds in table_stats.stages.items():
+            stages[stage] += stage_seconds
+        tables[table] = {
+            'rows': table_stats.rows,
+            'batches': table_stats.batches,
+            'seconds': round(table_stats.seconds, 3),
+            'rows_per_second': round(table_stats.rows / table_stats.seconds) if table_stats.seconds else None,
+            'stages': table_stats.stages,
+        }
+        if table_stats.queues:
+            tables[table]['queues'] = table_stats.queues
+        if table_stats.orphans or table_stats.dead_letters or table_stats.skipped:
+            tables[table].update(orphans=table_stats.orphans, dead_letters=table_stats.dead_letters,
+                                 skipped=table_stats.skipped)
+    rows = sum(table_stats.rows for table_stats in stats.values())
+    return {
+        'seconds': round(seconds, 3),
+        'rows': rows,
+        'rows_per_second': round(rows / seconds) if seconds else None,
+        'stages': {stage: round(stage_seconds, 3) for stage, stage_seconds in stages.items()},
+        'bottleneck': max(stages, key=stages.get) if stages else None,
+        'tables': tables,
+    }
+
+
+def save_summary(path, summary):
+    """
+    @param path: str
+    @param summary: dict
+    """
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(summary, file, ensure_ascii=False, indent=2)
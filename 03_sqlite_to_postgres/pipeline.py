@@ -0,0 +1,135 @@
+"""
+Конвейер загрузки таблицы: чтение SQLite, преобразование пачки и запись в Postgres выполняются одновременно
+в разных потоках и связаны очередями ограниченного размера. Пока Postgres принимает одну пачку,
+следующие уже читаются и кодируются; если запись не успевает, очереди заполняются и чтение останавливается.
+
+Потоки, а не процессы: sqlite3 и psycopg2 отпускают GIL на время работы базы, а именно это время
+и перекрывается. Ошибка любого этапа передаётся по очередям дальше и выбрасывается в основном потоке.
+"""
+import queue
+import threading
+import time
+
+from metrics import QueueStats
+
+PIPELINE_DEPTH = 2
+POLL_INTERVAL = 0.1
+
+
+class _Done:
+    """Конец потока элементов"""
+
+
+class _Failure:
+    """Ошибка предыдущего этапа"""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def _put(output, item, stop, stats):
+    """
+    @param output: queue.Queue
+    @param item: any
+    @param stop: threading.Event
+    @param stats: QueueStats
+    @return: bool - False, если конвейер остановлен, и элемент не положен
+    """
+    stats.observe(output.qsize())
+    started = time.perf_counter()
+    try:
+        while not stop.is_set():
+            try:
+                output.put(item, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+    finally:
+        stats.put_wait += time.perf_counter() - started
+
+
+def _drain(source, stop, stats):
+    """
+    @param source: queue.Queue
+    @param stop: threading.Event
+    @param stats: QueueStats
+    @return: generator - элементы до _Done, ошибка предыдущего этапа выбрасывается
+    """
+    while True:
+        started = time.perf_counter()
+        try:
+            while True:
+                if stop.is_set():
+                    return
+                try:
+                    item = source.get(timeout=POLL_INTERVAL)
+                    break
+                except queue.Empty:
+                    continue
+        finally:
+            stats.get_wait += time.perf_counter() - started
+        if isinstance(item, _Done):
+            return
+        if isinstance(item, _Failure):
+            raise item.error
+        yield item
+
+
+def _pump(items, output, stop, stats):
+    """
+    Тело потока этапа: всё, что даёт items, кладётся в output, в конце - _Done или _Failure
+    @param items: iterable
+    @param output: queue.Queue
+    @param stop: threading.Event
+    @param stats: QueueStats
+    """
+    items = iter(items)
+    try:
+        for item in items:
+            if not _put(output, item, stop, stats):
+                return
+    except BaseException as error:
+        _put(output, _Failure(error), stop, stats)
+    else:
+        _put(output, _Done(), stop, stats)
+    finally:
+        # Генератор закрывается в своём потоке: ParallelReader останавливает процессы чтения
+        if hasattr(items, 'close'):
+            items.close()
+
+
+def run_pipeline(source, transform, depth=PIPELINE_DEPTH, queues=None):
+    """
+    source читается в одном потоке, transform выполняется в другом, результат отдаётся в вызывающий поток.
+    Если потребитель прервал итерацию или упал, потоки останавливаются, и функция дожидается их завершения.
+    @param source: iterable
+    @param transform: function(item) -> item
+    @param depth: int - ёмкость каждой очереди, 0 - выполнять этапы последовательно без потоков
+    @param queues: dict | None - сюда записывается QueueStats очередей 'read' (source -> transform)
+        и 'transform' (transform -> потребитель)
+    @return: generator
+    """
+    if depth <= 0:
+        yield from map(transform, source)
+        return
+
+    stop = threading.Event()
+    read_queue, transform_queue = queue.Queue(depth), queue.Queue(depth)
+    read_stats, transform_stats = QueueStats(depth), QueueStats(depth)
+    if queues is not None:
+        queues.update({'read': read_stats, 'transform': transform_stats})
+    threads = [
+        threading.Thread(target=_pump, args=(source, read_queue, stop, read_stats), daemon=True),
+        threading.Thread(target=_pump, daemon=True, args=(
+            map(transform, _drain(read_queue, stop, read_stats)), transform_queue, stop, transform_stats,
+        )),
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        yield from _drain(transform_queue, stop, transform_stats)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,195 @@
+"""
+Чтение SQLite: файл открывается только на чтение (mode=ro&immutable=1) и отображается в память (mmap_size),
+большие таблицы делятся на диапазоны rowid, которые читают несколько процессов одновременно.
+
+immutable=1 отключает блокировки и проверку изменений файла, поэтому во время загрузки
+db.sqlite не должен никто изменять.
+"""
+import multiprocessing
+import pathlib
+import sqlite3
+from contextlib import closing
+
+MMAP_SIZE = 1 << 30
+QUEUE_SIZE = 4
+
+
+def open_sqlite(path, mmap_size=MMAP_SIZE):
+    """
+    @param path: str
+    @param mmap_size: int - байт файла, которые SQLite читает через mmap, а не через read()
+    @return: sqlite3.Connection
+    """
+    uri = f'{pathlib.Path(path).resolve().as_uri()}?mode=ro&immutable=1'
+    connection = sqlite3.connect(uri, uri=True)
+    connection.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+    return connection
+
+
+def _condition(where):
+    return f'rowid > ? AND rowid <= ? AND ({where})' if where else 'rowid > ? AND rowid <= ?'
+
+
+def get_rowid_ranges(cursor, table, partitions, after=0):
+    """
+    Делит rowid таблицы после after на partitions диапазонов одинаковой ширины
+    @param cursor: cursor_object
+    @param table: str
+    @param partitions: int
+    @param after: int
+    @return: list[tuple(int, int)] - диапазоны lower < rowid <= upper, по возрастанию
+    """
+    cursor.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {table} WHERE rowid > ?", (after,))
+    first, last = cursor.fetchone()
+    if first is None:
+        return []
+    lower = first - 1
+    step = max((last - lower + partitions - 1) // partitions, 1)
+    return [(start, min(start + step, last)) for start in range(lower, last, step)]
+
+
+def iter_range(cursor, table, lower, upper, batch_size, where='', params=()):
+    """
+    @param cursor: cursor_object
+    @param table: str
+    @param lower: int
+    @param upper: int
+    @param batch_size: int
+    @param where: str - дополнительное условие отбора с плейсхолдерами ?
+    @param params: tuple
+    @return: generator[tuple(int, list[tuple])] - rowid последней строки пачки и строки (rowid - первая колонка)
+    """
+    while True:
+        cursor.execute(f"SELECT rowid, * FROM {table} WHERE {_condition(where)} ORDER BY rowid LIMIT ?",
+                       (lower, upper, *params, batch_size))
+        results = cursor.fetchall()
+        if not results:
+            break
+        lower = results[-1][0]
+        yield lower, results
+
+
+def iter_table(path, table, batch_size, after, upper, where='', params=(), mmap_size=MMAP_SIZE):
+    """
+    iter_range через собственное подключение: генератор можно читать в другом потоке
+    @param path: str
+    @param table: str
+    @param batch_size: int
+    @param after: int
+    @param upper: int - максимальный rowid
+    @param where: str
+    @param params: tuple
+    @param mmap_size: int
+    @return: generator[tuple(int, list[tuple])]
+    """
+    with closing(open_sqlite(path, mmap_size)) as connection:
+        yield from iter_range(connection.cursor(), table, after, upper, batch_size, where, params)
+
+
+def _read_range(output, index, path, table, lower, upper, batch_size, where, params, mmap_size):
+    """
+    Процесс чтения одного диапазона: пачки кладутся в output, в конце - (index, None, None),
+    при ошибке - (index, None, исключение)
+    """
+    try:
+        with closing(open_sqlite(path, mmap_size)) as connection:
+            for last_rowid, rows in iter_range(connection.cursor(), table, lower, upper, batch_size, where, params):
+                output.put((index, last_rowid, rows))
+    except Exception as error:
+        output.put((index, None, error))
+    else:
+        output.put((index, None, None))
+
+
+class ParallelReader:
+    """
+    Чтение таблицы workers процессами, каждый читает свой диапазон rowid.
+    ordered=True отдаёт пачки в порядке rowid: у каждого диапазона своя очередь, и следующие диапазоны
+    читаются заранее не больше чем на queue_size пачек. ordered=False отдаёт пачки по мере готовности
+    из общей очереди, все процессы читают без остановки.
+    В обоих режимах вместе с пачкой отдаётся rowid, до которого включительно все строки уже отданы,
+    поэтому его можно сохранять как контрольную точку.
+    """
+
+    def __init__(self, path, table, batch_size, workers, ordered=True, after=0, where='', params=(),
+                 mmap_size=MMAP_SIZE, queue_size=QUEUE_SIZE):
+        """
+        @param path: str
+        @param table: str
+        @param batch_size: int
+        @param workers: int
+        @param ordered: bool
+        @param after: int - rowid, после которого начинать чтение
+        @param where: str
+        @param params: tuple
+        @param mmap_size: int
+        @param queue_size: int - пачек в очереди одного диапазона (при ordered=False - на процесс)
+        """
+        self.path = path
+        self.table = table
+        self.batch_size = batch_size
+        self.ordered = ordered
+        self.where = where
+        self.params = params
+        self.mmap_size = mmap_size
+        self.queue_size = queue_size
+        with closing(open_sqlite(path, mmap_size)) as connection:
+            cursor = connection.cursor()
+            self.ranges = get_rowid_ranges(cursor, table, workers, after)
+            cursor.execute(f"SELECT rowid, * FROM {table} LIMIT 0")
+            self.description = cursor.description
+
+    def _start(self, context, index, output):
+        lower, upper = self.ranges[index]
+        process = context.Process(target=_read_range, daemon=True, args=(
+            output, index, self.path, self.table, lower, upper, self.batch_size, self.where, self.params,
+            self.mmap_size,
+        ))
+        process.start()
+        return process
+
+    def __iter__(self):
+        """
+        @return: generator[tuple(int, list[tuple])] - как iter_range
+        """
+        if not self.ranges:
+            return
+        context = multiprocessing.get_context()
+        if self.ordered:
+            outputs = [context.Queue(self.queue_size) for _ in self.ranges]
+        else:
+            outputs = [context.Queue(self.queue_size * len(self.ranges))] * len(self.ranges)
+        processes = [self._start(context, index, output) for index, output in enumerate(outputs)]
+        # Последний отданный rowid и признак завершения по каждому диапазону
+        positions = [lower for lower, _ in self.ranges]
+        done = [False] * len(self.ranges)
+        current = 0
+        try:
+            while not all(done):
+                index, last_rowid, payload = outputs[current if self.ordered else 0].get()
+                if last_rowid is None:
+                    if payload is not None:
+                        raise payload
+                    done[index] = True
+                    positions[index] = self.ranges[index][1]
+                    while current < len(done) and done[current]:
+                        current += 1
+                    continue
+                positions[index] = last_rowid
+                yield self._safe_position(positions, done), payload
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+
+    def _safe_position(self, positions, done):
+        """
+        @param positions: list[int]
+        @param done: list[bool]
+        @return: int - rowid, до которого все диапазоны отданы без пропусков
+        """
+        for position, is_done in zip(positions, done):
+            if not is_done:
+                return position
+        return positions[-1]
@@ -0,0 +1,103 @@
+import json
+import os
+
+
+class JsonFileState:
+    """Состояние загрузки между запусками, хранится в JSON-файле"""
+
+    def __init__(self, path):
+        """
+        @param path: str
+        """
+        self.path = path
+
+    def load(self):
+        """
+        @return: dict
+        """
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, encoding='utf-8') as file:
+            return json.load(file)
+
+    def save(self, data):
+        """
+        Запись через временный файл, чтобы падение посреди записи не испортило состояние
+        @param data: dict
+        """
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class WatermarkState(JsonFileState):
+    """Максимальное значение modified/created по каждой таблице на момент последней загрузки"""
+
+    def get(self, table):
+        """
+        @param table: str
+        @return: str | None
+        """
+        return self.load().get(table)
+
+    def update(self, watermarks):
+        """
+        @param watermarks: dict{table: str | None}
+        """
+        data = self.load()
+        data.update({table: value for table, value in watermarks.items() if value is not None})
+        self.save(data)
+
+
+class CheckpointState(JsonFileState):
+    """
+    Прогресс загрузки одной таблицы: последний закоммиченный rowid, количество строк и watermark.
+    У каждой таблицы свой файл, чтобы параллельные процессы не писали в один и тот же.
+    Вместе с прогрессом хранится source - файл SQLite и режим загрузки: контрольная точка, оставшаяся
+    от загрузки другого файла или в другом режиме, считается отсутствующей.
+    """
+
+    def __init__(self, directory, table, source=None):
+        """
+        @param directory: str
+        @param table: str
+        @param source: dict | None - см. load_data.get_checkpoint_source
+        """
+        super().__init__(os.path.join(directory, f'{table}.json'))
+        self.table = table
+        self.source = source
+
+    def load(self):
+        data = super().load()
+        return data if data.get('source') == self.source else {}
+
+    def save(self, data):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        super().save({'table': self.table, 'source': self.source, **data})
+
+    @staticmethod
+    def exists(directory, source=None):
+        """
+        @param directory: str
+        @param source: dict | None
+        @return: bool - есть ли незавершённая загрузка того же файла в том же режиме
+        """
+        if not os.path.isdir(directory):
+            return False
+        return any(
+            JsonFileState(os.path.join(directory, name)).load().get('source') == source
+            for name in os.listdir(directory) if name.endswith('.json')
+        )
+
+    @staticmethod
+    def clear(directory):
+        """
+        Удаляет все контрольные точки после успешного завершения загрузки
+        @param directory: str
+        """
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            if name.endswith('.json'):
+                os.remove(os.path.join(directory, name))
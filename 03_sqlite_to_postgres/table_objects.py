@@ -1,23 +1,30 @@
 import uuid
-from dataclasses import dataclass, field
+from dataclasses import dataclass, fields
 from datetime import datetime
+from itertools import starmap
+from operator import itemgetter
+
+# Имена колонок Postgres, которые отличаются от имён полей dataclass
+PG_ALIASES = {'film_work_id': 'film_work', 'person_id': 'person', 'genre_id': 'genre'}
 
 
 @dataclass()
 class Person:
-    id: uuid = field(default=None)
-    full_name: str = field(default=None)
-    created: datetime = field(default=None)
-    modified: datetime = field(default=None)
+    __slots__ = ('id', 'full_name', 'created', 'modified')
+    id: uuid
+    full_name: str
+    created: datetime
+    modified: datetime
 
 
 @dataclass()
 class Genre:
-    id: uuid = field(default=None)
-    name: str = field(default=None)
-    description: str = field(default=None)
-    created: datetime = field(default=None)
-    updated: datetime = field(default=None)
+    __slots__ = ('id', 'name', 'description', 'created', 'updated')
+    id: uuid
+    name: str
+    description: str
+    created: datetime
+    updated: datetime
 
     def __eq__(self, other):
         """ Убрал поля created и updated для удобства сравнения в тестировии """
@@ -29,32 +36,35 @@ class Genre:
 
 @dataclass()
 class GenreFilmwork:
-    id: uuid = field(default=None)
-    film_work: uuid = field(default=None)
-    genre: uuid = field(default=None)
-    created: datetime = field(default=None)
+    __slots__ = ('id', 'film_work', 'genre', 'created')
+    id: uuid
+    film_work: uuid
+    genre: uuid
+    created: datetime
 
 
 @dataclass()
 class PersonFilmWork:
-    id: str = field(default=None)
-    film_work: str = field(default=None)
-    person: str = field(default=None)
-    role: str = field(default=None)
-    created: str = field(default=None)
+    __slots__ = ('id', 'film_work', 'person', 'role', 'created')
+    id: str
+    film_work: str
+    person: str
+    role: str
+    created: str
 
 
 @dataclass()
 class Filmwork:
-    id: uuid = field(default=None)
-    title: str = field(default=None)
-    description: str = field(default=None)
-    creation_date: datetime = field(default=None)
-    file_path: str = field(default=None)
-    rating: float = field(default=None)
-    type: str = field(default=None)
-    created: datetime = field(default=None)
-    modified: datetime = field(default=None)
+    __slots__ = ('id', 'title', 'description', 'creation_date', 'file_path', 'rating', 'type', 'created', 'modified')
+    id: uuid
+    title: str
+    description: str
+    creation_date: datetime
+    file_path: str
+    rating: float
+    type: str
+    created: datetime
+    modified: datetime
 
     def __eq__(self, other):
         """ Убрал поле file_path для удобства сравнения в тестировии """
@@ -63,3 +73,97 @@ class Filmwork:
             self.creation_date == other.creation_date, self.rating == other.rating,
             self.type == other.type, self.created == other.created, self.modified == other.modified
         ))
+
+
+class RowMapper:
+    """
+    Преобразование строк курсора в объекты table или кортежи для записи.
+    Собирается один раз на таблицу: позиции колонок вычисляются заранее, и значения выбираются
+    operator.itemgetter - на строку приходится один вызов на C без setattr и циклов.
+    Если поля нет в запросе или для него задан converter, используется обычная функция на Python.
+    """
+
+    def __init__(self, table, columns, converters=None):
+        """
+        @param table: class
+        @param columns: list[str | None] - поле table для каждой колонки результата запроса, None - колонка не нужна
+        @param converters: dict{field_name: function} - преобразование значения поля, None не передаётся
+        """
+        self.table = table
+        self.positions = {name: position for position, name in enumerate(columns) if name is not None}
+        self.converters = converters or {}
+        self.values = self.output([table_field.name for table_field in fields(table)])
+
+    @classmethod
+    def from_description(cls, table, description, aliases=PG_ALIASES, converters=None):
+        """
+        Колонки сопоставляются полям по именам (Postgres)
+        @param table: class
+        @param description: cursor.description
+        @param aliases: dict{column_name: field_name}
+        @param converters: dict{field_name: function}
+        @return: RowMapper
+        """
+        names = {table_field.name for table_field in fields(table)}
+        columns = [aliases.get(column[0], column[0]) for column in description]
+        return cls(table, [column if column in names else None for column in columns], converters)
+
+    @classmethod
+    def positional(cls, table, description, converters=None):
+        """
+        Колонки сопоставляются полям по порядку (SQLite): последние колонки запроса - поля table,
+        лишние колонки в начале (например, rowid) пропускаются
+        @param table: class
+        @param description: cursor.description
+        @param converters: dict{field_name: function}
+        @return: RowMapper
+        """
+        field_names = [table_field.name for table_field in fields(table)]
+        return cls(table, [None] * (len(description) - len(field_names)) + field_names, converters)
+
+    def output(self, field_names):
+        """
+        @param field_names: tuple[str]
+        @return: function(row) -> tuple - значения полей field_names в заданном порядке
+        """
+        positions = [self.positions.get(field_name) for field_name in field_names]
+        if None not in positions and not self.converters.keys() & set(field_names):
+            if len(positions) == 1:
+                position = positions[0]
+                return lambda row: (row[position],)
+            return itemgetter(*positions)
+
+        steps = [(position, self.converters.get(field_name)) for field_name, position in zip(field_names, positions)]
+
+        def values(row):
+            result = []
+            for position, convert in steps:
+                value = None if position is None else row[position]
+                result.append(convert(value) if convert is not None and value is not None else value)
+            return tuple(result)
+        return values
+
+    def getter(self, field_name):
+        """
+        @param field_name: str
+        @return: function(row) -> значение поля
+        """
+        position = self.positions.get(field_name)
+        if position is not None and field_name not in self.converters:
+            return itemgetter(position)
+        values = self.output([field_name])
+        return lambda row: values(row)[0]
+
+    def to_record(self, row):
+        """
+        @param row: tuple
+        @return: class_object
+        """
+        return self.table(*self.values(row))
+
+    def to_records(self, rows):
+        """
+        @param rows: list[tuple]
+        @return: list[class_objects]
+        """
+        return list(starmap(self.table, map(self.values, rows)))
@@ -0,0 +1,112 @@
+import psycopg2
+from dead_letter import get_error_message, validate_choices, write_batch
+
+BAD = 'bad'
+
+
+class FakeWriter:
+    """Пишет пачку целиком или падает, если в ней есть строка с BAD"""
+
+    def __init__(self, error=psycopg2.DataError):
+        self.error = error
+        self.sent = []
+        self.pending = []
+
+    def encode(self, data):
+        return list(data)
+
+    def send(self, payload):
+        if any(BAD in row for row in payload):
+            raise self.error(f'invalid value in {payload[0][0]}')
+        self.pending.extend(payload)
+
+
+class FakeConnection:
+    """commit переносит записанное writer в sent, rollback отбрасывает"""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.commits = 0
+        self.rollbacks = 0
+
+    def commit(self):
+        self.commits += 1
+        self.writer.sent.extend(self.writer.pending)
+        self.writer.pending = []
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.writer.pending = []
+
+
+def make_rows(count, bad=()):
+    return [(number, BAD if number in bad else 'ok') for number in range(count)]
+
+
+def test_write_batch_without_errors():
+    writer = FakeWriter()
+    pg_conn = FakeConnection(writer)
+    data = make_rows(8)
+    assert write_batch(writer, pg_conn, data) == []
+    assert writer.sent == data
+    assert (pg_conn.commits, pg_conn.rollbacks) == (1, 0)
+
+
+def test_write_batch_bisects_to_bad_rows():
+    writer = FakeWriter()
+    pg_conn = FakeConnection(writer)
+    data = make_rows(16, bad={3, 12})
+    failed = write_batch(writer, pg_conn, data)
+    assert failed == [(data[3], 'invalid value in 3'), (data[12], 'invalid value in 12')]
+    assert sorted(writer.sent) == [row for row in data if row[1] != BAD]
+    # Откатываются только части с плохой строкой: 16, обе восьмёрки, по две четвёрки, двойки и строки
+    assert pg_conn.rollbacks == 1 + 2 + 2 + 2 + 2
+
+
+def test_write_batch_all_rows_bad():
+    writer = FakeWriter(psycopg2.IntegrityError)
+    pg_conn = FakeConnection(writer)
+    data = make_rows(3, bad={0, 1, 2})
+    assert [row for row, _ in write_batch(writer, pg_conn, data)] == data
+    assert writer.sent == []
+
+
+def test_write_batch_uses_payload():
+    writer = FakeWriter()
+    pg_conn = FakeConnection(writer)
+    data = make_rows(2)
+    assert write_batch(writer, pg_conn, data, payload=data[:1]) == []
+    assert writer.sent == data[:1]
+
+
+def test_write_batch_reraises_other_errors():
+    writer = FakeWriter(psycopg2.OperationalError)
+    pg_conn = FakeConnection(writer)
+    try:
+        write_batch(writer, pg_conn, make_rows(4, bad={1}))
+    except psycopg2.OperationalError:
+        pass
+    else:
+        raise AssertionError('OperationalError должна прервать загрузку')
+    assert pg_conn.rollbacks == 0
+
+
+def test_validate_choices():
+    choices = ((1, 'type', ('movie', 'tv_show')), (2, 'role', ('actor',)))
+    data = [('a', 'movie', 'actor'), ('b', 'cartoon', 'actor'), ('c', None, 'writer')]
+    valid, rejected = validate_choices(data, choices)
+    assert valid == data[:1]
+    assert rejected == [
+        (data[1], "type: недопустимое значение 'cartoon'"),
+        (data[2], "type: недопустимое значение None; role: недопустимое значение 'writer'"),
+    ]
+
+
+def test_validate_choices_without_checks():
+    data = [('a', 'anything')]
+    assert validate_choices(data, ()) == (data, [])
+
+
+def test_get_error_message():
+    assert get_error_message(ValueError('first line\nsecond line')) == 'first line'
+    assert get_error_message(TypeError()) == 'TypeError'
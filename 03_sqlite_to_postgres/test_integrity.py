@@ -0,0 +1,88 @@
+import uuid
+
+from integrity import UUID_SIZE, UuidSet, find_orphans, uuid_bytes
+
+
+def make_uuid(prefix, tail):
+    """
+    @param prefix: bytes - первые байты, по первым двум выбирается корзина
+    @param tail: bytes
+    @return: uuid.UUID
+    """
+    return uuid.UUID(bytes=(prefix + tail).ljust(UUID_SIZE, b'\0'))
+
+
+def test_uuid_bytes():
+    value = uuid.uuid4()
+    assert uuid_bytes(value) == value.bytes
+    assert uuid_bytes(str(value)) == value.bytes
+    assert uuid_bytes(value.hex) == value.bytes
+    assert uuid_bytes('not-a-uuid') is None
+    assert uuid_bytes('abcd') is None
+    assert uuid_bytes(None) is None
+
+
+def test_contains():
+    values = [uuid.uuid4() for _ in range(100)]
+    ids = UuidSet(str(value) for value in values[:50])
+    assert len(ids) == 50
+    assert ids.nbytes == 50 * UUID_SIZE
+    assert ids.contains_many(values) == [True] * 50 + [False] * 50
+    assert values[0] in ids and str(values[0]) in ids
+    assert values[99] not in ids
+
+
+def test_unaligned_match_is_skipped():
+    """Байты id из середины одного id и начала следующего той же корзины - не id из множества"""
+    first = make_uuid(b'\0\1' + b'\xaa' * 6 + b'\0\1', b'\xbb' * 6)
+    second = make_uuid(b'\0\1', b'\xcc' * 14)
+    spanning = uuid.UUID(bytes=first.bytes[8:] + second.bytes[:8])
+    ids = UuidSet([first, second])
+    assert ids.buckets[1].find(spanning.bytes) == 8
+    assert spanning not in ids
+    assert ids.contains_many([first, spanning, second]) == [True, False, True]
+
+    ids.add(spanning)
+    assert spanning in ids
+    ids.discard(spanning)
+    assert spanning not in ids
+    assert ids.contains_many([first, second]) == [True, True]
+    assert len(ids) == 2
+
+
+def test_discard():
+    values = [make_uuid(b'\0\0', bytes([number])) for number in range(3)]
+    ids = UuidSet(values)
+    ids.discard(values[1])
+    ids.discard(uuid.uuid4())
+    ids.discard('not-a-uuid')
+    assert len(ids) == 2
+    assert ids.contains_many(values) == [True, False, True]
+
+
+def test_non_uuid_values_are_skipped():
+    ids = UuidSet(['not-a-uuid', None, 'abcd'])
+    assert len(ids) == 0
+    assert ids.contains_many(['not-a-uuid', None]) == [False, False]
+
+
+def test_find_orphans():
+    film_works, persons = [uuid.uuid4() for _ in range(2)], [uuid.uuid4() for _ in range(2)]
+    references = [(1, 'film_work', UuidSet(film_works[:1])), (2, 'person', UuidSet(persons[:1]))]
+    data = [
+        ('valid', str(film_works[0]), str(persons[0])),
+        ('no film_work', str(film_works[1]), str(persons[0])),
+        ('no both', str(film_works[1]), str(persons[1])),
+    ]
+    valid, orphans = find_orphans(data, references)
+    assert valid == data[:1]
+    assert orphans == [
+        (data[1], {'film_work': str(film_works[1])}),
+        (data[2], {'film_work': str(film_works[1]), 'person': str(persons[1])}),
+    ]
+
+
+def test_find_orphans_without_references():
+    data = [('row', 'x')]
+    assert find_orphans(data, []) == (data, [])
+    assert find_orphans([], [(1, 'film_work', UuidSet())]) == ([], [])
@@ -0,0 +1,205 @@
+import json
+import os
+import sqlite3
+import struct
+import uuid
+from contextlib import closing
+from datetime import date, datetime, timezone
+
+import load_data
+import psycopg2
+import pytest
+from generate_data import generate
+from load_data import (MIGRATIONS, LoadOptions, load_blue_green,
+                       load_from_sqlite)
+from writers import PGCOPY_HEADER, PGCOPY_TRAILER, BinaryCopyWriter, CopyWriter
+
+# Схема content в том виде, в каком её создают миграции Django, без индексов для админки
+SCHEMA = """
+CREATE SCHEMA content;
+CREATE TABLE content.person (
+    id uuid PRIMARY KEY, full_name varchar(50) NOT NULL,
+    created timestamp with time zone NOT NULL, modified timestamp with time zone NOT NULL
+);
+CREATE TABLE content.filmwork (
+    id uuid PRIMARY KEY, title varchar(100) NOT NULL, description text, creation_date date,
+    rating double precision, type varchar(50) NOT NULL,
+    created timestamp with time zone NOT NULL, modified timestamp with time zone NOT NULL
+);
+CREATE TABLE content.genre (id uuid PRIMARY KEY, name varchar(255) NOT NULL, description text);
+CREATE TABLE content.person_filmwork (
+    id uuid PRIMARY KEY,
+    film_work_id uuid NOT NULL REFERENCES content.filmwork DEFERRABLE INITIALLY DEFERRED,
+    person_id uuid NOT NULL REFERENCES content.person DEFERRABLE INITIALLY DEFERRED,
+    role varchar(10) NOT NULL, created timestamp with time zone NOT NULL,
+    CONSTRAINT film_work_person_role_idx UNIQUE (film_work_id, person_id, role)
+);
+CREATE TABLE content.genre_filmwork (
+    id uuid PRIMARY KEY,
+    film_work_id uuid NOT NULL REFERENCES content.filmwork DEFERRABLE INITIALLY DEFERRED,
+    genre_id uuid NOT NULL REFERENCES content.genre DEFERRABLE INITIALLY DEFERRED,
+    created timestamp with time zone NOT NULL,
+    CONSTRAINT genre_film_work_idx UNIQUE (film_work_id, genre_id)
+);
+"""
+
+
+class Interrupted(Exception):
+    """Сбой загрузки посреди таблицы"""
+
+
+class FakeCursor:
+    """Для BinaryCopyWriter: description с OID типов колонок, запросы не выполняются"""
+
+    def __init__(self, type_codes):
+        self.description = [psycopg2.extensions.Column(type_code=type_code) for type_code in type_codes]
+
+    def execute(self, sql, params=None):
+        pass
+
+
+@pytest.fixture
+def dsl():
+    """
+    Пустая база с таблицами content на сервере из DB_HOST, DB_PORT, DB_USER, DB_PASSWORD;
+    DB_NAME - база, из которой создаётся и удаляется тестовая. Без сервера тест пропускается
+    """
+    server = {'user': os.environ.get('DB_USER'), 'password': os.environ.get('DB_PASSWORD'),
+              'host': os.environ.get('DB_HOST'), 'port': os.environ.get('DB_PORT')}
+    try:
+        admin_conn = psycopg2.connect(dbname=os.environ.get('DB_NAME') or 'postgres', **server)
+    except psycopg2.OperationalError as error:
+        pytest.skip(f'Postgres недоступен: {error}')
+    admin_conn.autocommit = True
+    dbname = f'test_loader_{uuid.uuid4().hex[:8]}'
+    with closing(admin_conn), admin_conn.cursor() as cursor:
+        cursor.execute(f"CREATE DATABASE {dbname} TEMPLATE template0")
+        try:
+            test_dsl = {'dbname': dbname, **server}
+            with closing(psycopg2.connect(**test_dsl)) as pg_conn, pg_conn.cursor() as pg_cursor:
+                pg_cursor.execute(SCHEMA)
+                pg_conn.commit()
+            yield test_dsl
+        finally:
+            cursor.execute(f"DROP DATABASE {dbname} WITH (FORCE)")
+
+
+@pytest.fixture
+def options(tmp_path):
+    return LoadOptions(batch_size=10, checkpoint_dir=str(tmp_path / 'checkpoints'),
+                       orphans_path=str(tmp_path / 'orphans.jsonl'),
+                       dead_letter_path=str(tmp_path / 'dead_letter.jsonl'),
+                       watermarks_path=str(tmp_path / 'watermarks.json'), progress=False)
+
+
+def count_rows(dsl):
+    """
+    @param dsl: dict
+    @return: dict{sqlite_table: int}
+    """
+    with closing(psycopg2.connect(**dsl)) as pg_conn, pg_conn.cursor() as cursor:
+        counts = {}
+        for migration in MIGRATIONS:
+            cursor.execute(f"SELECT COUNT(*) FROM content.{migration.pg_table}")
+            counts[migration.sqlite_table] = cursor.fetchone()[0]
+        return counts
+
+
+def test_copy_writer_encode():
+    writer = CopyWriter(None, 'genre', ('id', 'name', 'description'), on_conflict=False)
+    payload = writer.encode([('1', 'a\tb', None), ('2', 'line\nbreak\\', 'x\ry')])
+    assert payload.getvalue() == '1\ta\\tb\t\\N\n2\tline\\nbreak\\\\\tx\\ry\n'
+
+
+def test_binary_copy_writer_encode():
+    writer = BinaryCopyWriter(FakeCursor([2950, 25, 701, 1082, 1184]), 'filmwork',
+                              ('id', 'title', 'rating', 'creation_date', 'created'), on_conflict=False)
+    row_id = uuid.uuid4()
+    payload = writer.encode([
+        (str(row_id), 'Фильм', 7.5, '2000-01-02', '2000-01-01 00:00:01.5+00'),
+        (str(row_id), 'Без даты', None, None, datetime(1999, 12, 31, 23, 59, tzinfo=timezone.utc)),
+    ])
+    data = payload.getvalue()
+    assert data.startswith(PGCOPY_HEADER) and data.endswith(PGCOPY_TRAILER)
+
+    fields, position = [], len(PGCOPY_HEADER)
+    for _ in range(2):
+        assert struct.unpack_from('!h', data, position) == (5,)
+        position += 2
+        for _ in range(5):
+            size, = struct.unpack_from('!i', data, position)
+            position += 4
+            fields.append(None if size == -1 else data[position:position + size])
+            position += max(size, 0)
+    assert position == len(data) - len(PGCOPY_TRAILER)
+
+    assert fields[0] == row_id.bytes
+    assert fields[1] == 'Фильм'.encode()
+    assert struct.unpack('!d', fields[2]) == (7.5,)
+    assert struct.unpack('!i', fields[3]) == ((date(2000, 1, 2) - date(2000, 1, 1)).days,)
+    assert struct.unpack('!q', fields[4]) == (1_500_000,)
+    assert fields[7:9] == [None, None]
+    assert struct.unpack('!q', fields[9]) == (-60 * 10 ** 6,)
+
+
+def test_resume_after_interruption(dsl, options, tmp_path, monkeypatch):
+    sqlite_path = str(tmp_path / 'db.sqlite')
+    generate(sqlite_path, 30)
+    write_rows, calls = load_data.write_rows, []
+
+    def counted_write_rows(writer, pg_conn, data, *args, **kwargs):
+        calls.append(len(data))
+        return write_rows(writer, pg_conn, data, *args, **kwargs)
+
+    def interrupted_write_rows(*args, **kwargs):
+        if len(calls) == 7:
+            raise Interrupted
+        return counted_write_rows(*args, **kwargs)
+
+    monkeypatch.setattr(load_data, 'write_rows', counted_write_rows)
+    with closing(sqlite3.connect(sqlite_path)) as sqlite_conn, closing(psycopg2.connect(**dsl)) as pg_conn:
+        load_from_sqlite(sqlite_conn, pg_conn, options)
+    expected, batches = count_rows(dsl), len(calls)
+
+    calls.clear()
+    monkeypatch.setattr(load_data, 'write_rows', interrupted_write_rows)
+    with closing(sqlite3.connect(sqlite_path)) as sqlite_conn, closing(psycopg2.connect(**dsl)) as pg_conn:
+        with pytest.raises(Interrupted):
+            load_from_sqlite(sqlite_conn, pg_conn, options)
+    assert os.listdir(options.checkpoint_dir)
+    assert sum(count_rows(dsl).values()) == sum(calls)
+
+    calls.clear()
+    monkeypatch.setattr(load_data, 'write_rows', counted_write_rows)
+    with closing(sqlite3.connect(sqlite_path)) as sqlite_conn, closing(psycopg2.connect(**dsl)) as pg_conn:
+        stats = load_from_sqlite(sqlite_conn, pg_conn, options)
+    # Продолжение не очищает таблицы и записывает только пачки, не закоммиченные до сбоя
+    assert len(calls) == batches - 7
+    assert count_rows(dsl) == expected
+    assert {table: table_stats.rows for table, table_stats in stats.items()} == expected
+    assert not os.path.exists(options.checkpoint_dir) or not os.listdir(options.checkpoint_dir)
+
+
+def test_blue_green_moves_natural_key_duplicates(dsl, options, tmp_path):
+    sqlite_path = str(tmp_path / 'db.sqlite')
+    counts = generate(sqlite_path, 30)
+    with closing(sqlite3.connect(sqlite_path)) as sqlite_conn:
+        sqlite_conn.execute("DROP INDEX film_work_person")
+        duplicate = sqlite_conn.execute("SELECT * FROM person_film_work ORDER BY rowid LIMIT 1").fetchone()
+        duplicate_id = str(uuid.uuid4())
+        sqlite_conn.execute("INSERT INTO person_film_work VALUES (?, ?, ?, ?, ?)", (duplicate_id, *duplicate[1:]))
+        sqlite_conn.commit()
+
+    stats = load_blue_green(sqlite_path, dsl, LoadOptions(**{**options.__dict__, 'blue_green': True, 'workers': 2}))
+
+    assert count_rows(dsl) == counts
+    assert stats['person_film_work'].dead_letters == stats['person_film_work'].skipped == 1
+    with open(options.dead_letter_path, encoding='utf-8') as file:
+        dead_letters = [json.loads(line) for line in file]
+    assert [(entry['table'], entry['row']['id']) for entry in dead_letters] == [('person_film_work', duplicate_id)]
+    assert dead_letters[0]['error'].startswith('film_work_person_role_idx')
+    with closing(psycopg2.connect(**dsl)) as pg_conn, pg_conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT conname FROM pg_constraint WHERE conrelid = 'content.person_filmwork'::regclass AND contype = 'u'
+            """)
+        assert cursor.fetchall() == [('film_work_person_role_idx',)]
@@ -0,0 +1,49 @@
+import sqlite3
+import uuid
+
+from load_data import MIGRATIONS
+from verify import chunk_bounds, has_lowercase_ids, iter_sqlite_rows
+
+GENRE = next(migration for migration in MIGRATIONS if migration.sqlite_table == 'genre')
+
+
+def make_genres(ids):
+    """
+    @param ids: list[str]
+    @return: sqlite3.Connection
+    """
+    connection = sqlite3.connect(':memory:')
+    connection.execute("""
+        CREATE TABLE genre (
+            id TEXT PRIMARY KEY, name TEXT NOT NULL, description TEXT,
+            created timestamp with time zone, modified timestamp with time zone
+        )
+        """)
+    connection.executemany("INSERT INTO genre (id, name) VALUES (?, ?)", [(id_, id_[:8]) for id_ in ids])
+    return connection
+
+
+def read_ids(connection, key=None, lowercase_ids=False):
+    bounds = chunk_bounds(key) if key else (None, None)
+    return [row[0] for row in iter_sqlite_rows(connection, GENRE, *bounds, lowercase_ids=lowercase_ids)]
+
+
+def test_lowercase_ids_use_primary_key_index():
+    ids = sorted(str(uuid.uuid4()) for _ in range(50))
+    connection = make_genres(ids)
+    assert has_lowercase_ids(connection, GENRE)
+    plan = connection.execute("EXPLAIN QUERY PLAN SELECT * FROM genre WHERE id >= ? AND id < ? ORDER BY id",
+                              chunk_bounds('a')).fetchall()
+    assert 'USING INDEX' in plan[0][-1]
+    assert read_ids(connection, lowercase_ids=True) == ids
+    assert read_ids(connection, 'a', lowercase_ids=True) == [id_ for id_ in ids if id_.startswith('a')]
+
+
+def test_uppercase_ids_are_read_in_lowercase_order():
+    ids = ['0a000000-0000-0000-0000-000000000000', 'B0000000-0000-0000-0000-000000000000',
+           'a0000000-0000-0000-0000-000000000000', 'bF000000-0000-0000-0000-000000000000']
+    connection = make_genres(ids)
+    assert not has_lowercase_ids(connection, GENRE)
+    assert read_ids(connection) == sorted(id_.lower() for id_ in ids)
+    assert read_ids(connection, 'b') == ['b0000000-0000-0000-0000-000000000000',
+                                         'bf000000-0000-0000-0000-000000000000']
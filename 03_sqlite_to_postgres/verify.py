@@ -0,0 +1,288 @@
+"""
+Сверка данных SQLite и Postgres.
+
+Обе стороны читаются потоково, отсортированными по id, и разбиваются на блоки по первым символам id.
+Postgres сортирует uuid как байты, то есть как hex-строки в нижнем регистре. Если все id в SQLite
+в нижнем регистре, SQLite сортирует и отбирает блоки по самому id и идёт по индексу первичного ключа.
+Иначе - по lower(id), без индекса: id в верхнем регистре оказались бы в другом месте потока.
+Для каждого блока считается хеш нормализованных строк; построчно сравниваются только блоки,
+хеши которых не совпали. В режиме выборки проверяется случайная доля блоков.
+"""
+import hashlib
+import random
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+
+from load_data import BATCH_SIZE, MIGRATIONS
+from table_objects import RowMapper
+from writers import parse_timestamp
+
+PREFIX_LENGTH = 3
+MAX_DIFFS = 100
+
+ID_FIELDS = ('id', 'film_work', 'person', 'genre')
+TIMESTAMP_FIELDS = ('created', 'modified', 'updated')
+DATE_FIELDS = ('creation_date',)
+
+
+@dataclass
+class TableReport:
+    """Результат сверки одной таблицы, id расхождений сохраняются не больше MAX_DIFFS на вид"""
+    table: str
+    sqlite_rows: int = 0
+    pg_rows: int = 0
+    chunks: int = 0
+    mismatched_chunks: int = 0
+    missing_in_pg: list = field(default_factory=list)
+    missing_in_sqlite: list = field(default_factory=list)
+    different: list = field(default_factory=list)
+
+    @property
+    def ok(self):
+        return not (self.missing_in_pg or self.missing_in_sqlite or self.different)
+
+
+def normalize_value(field_name, value):
+    """
+    Единственное место, где значения обеих баз приводятся к общему виду:
+    SQLite отдаёт строки, Postgres - datetime, date, float и uuid
+    @param field_name: str
+    @param value: any
+    @return: str | None
+    """
+    if value is None:
+        return None
+    if field_name in TIMESTAMP_FIELDS:
+        return parse_timestamp(value).astimezone(timezone.utc).isoformat(timespec='microseconds')
+    if field_name in DATE_FIELDS:
+        if isinstance(value, datetime):
+            value = value.date()
+        return value.isoformat() if isinstance(value, date) else str(value)[:10]
+    if field_name in ID_FIELDS:
+        return str(value).lower()
+    if isinstance(value, (int, float)):
+        return repr(float(value))
+    return str(value)
+
+
+def _normalize_rows(rows, to_output, field_names):
+    """
+    @param rows: iterable[tuple]
+    @param to_output: function(row) -> tuple
+    @param field_names: tuple[str]
+    @return: generator[tuple] - нормализованные значения, id первым
+    """
+    for row in rows:
+        yield tuple(normalize_value(name, value) for name, value in zip(field_names, to_output(row)))
+
+
+def chunk_bounds(key):
+    """
+    Границы блока id с префиксом key: lower <= id < upper
+    @param key: str
+    @return: tuple(str, str | None)
+    """
+    def to_uuid(prefix):
+        return f'{prefix.ljust(8, "0")}-0000-0000-0000-000000000000'
+
+    upper = int(key, 16) + 1
+    if upper >= 16 ** len(key):
+        return to_uuid(key), None
+    return to_uuid(key), to_uuid(f'{upper:0{len(key)}x}')
+
+
+def _range_condition(lower, upper, cast='', column='id'):
+    conditions, params = [], []
+    if lower is not None:
+        conditions.append(f'{column} >= {"%s" if cast else "?"}{cast}')
+        params.append(lower)
+    if upper is not None:
+        conditions.append(f'{column} < {"%s" if cast else "?"}{cast}')
+        params.append(upper)
+    return (f'WHERE {" AND ".join(conditions)}' if conditions else ''), tuple(params)
+
+
+def has_lowercase_ids(connection, migration):
+    """
+    Проверка идёт по индексу первичного ключа и не читает сами строки
+    @param connection: sqlite3.Connection
+    @param migration: load_data.TableMigration
+    @return: bool
+    """
+    cursor = connection.execute(f"SELECT 1 FROM {migration.sqlite_table} WHERE id <> lower(id) LIMIT 1")
+    return cursor.fetchone() is None
+
+
+def iter_sqlite_rows(connection, migration, lower=None, upper=None, batch_size=BATCH_SIZE, lowercase_ids=False):
+    """
+    @param connection: sqlite3.Connection
+    @param migration: load_data.TableMigration
+    @param lower: str | None
+    @param upper: str | None
+    @param batch_size: int
+    @param lowercase_ids: bool - все id в нижнем регистре (has_lowercase_ids), можно идти по индексу id
+    @return: generator[tuple] - нормализованные строки, отсортированные по id
+    """
+    column = 'id' if lowercase_ids else 'lower(id)'
+    where, params = _range_condition(lower, upper, column=column)
+    cursor = connection.cursor()
+    cursor.execute(f"SELECT * FROM {migration.sqlite_table} {where} ORDER BY {column}", params)
+    to_output = RowMapper.positional(migration.table, cursor.description).output(migration.fields)
+    try:
+        while True:
+            results = cursor.fetchmany(batch_size)
+            if not results:
+                break
+            yield from _normalize_rows(results, to_output, migration.fields)
+    finally:
+        cursor.close()
+
+
+def iter_pg_rows(pg_conn, migration, lower=None, upper=None, batch_size=BATCH_SIZE):
+    """
+    Серверный курсор: Postgres отдаёт строки порциями по batch_size, а не весь результат сразу
+    @param pg_conn: connection_object
+    @param migration: load_data.TableMigration
+    @param lower: str | None
+    @param upper: str | None
+    @param batch_size: int
+    @return: generator[tuple] - нормализованные строки, отсортированные по id
+    """
+    where, params = _range_condition(lower, upper, cast='::uuid')
+    with pg_conn.cursor(name=f'verify_{migration.pg_table}') as cursor:
+        cursor.itersize = batch_size
+        cursor.execute(f"SELECT {', '.join(migration.columns)} FROM content.{migration.pg_table} {where} ORDER BY id",
+                       params)
+        to_output = None
+        while True:
+            results = cursor.fetchmany(batch_size)
+            if not results:
+                break
+            if to_output is None:
+                to_output = RowMapper.from_description(migration.table, cursor.description).output(migration.fields)
+            yield from _normalize_rows(results, to_output, migration.fields)
+
+
+def merge_by_key(left, right):
+    """
+    Слияние двух потоков, отсортированных по первому элементу
+    @param left: iterable[tuple]
+    @param right: iterable[tuple]
+    @return: generator[tuple(key, left_item | None, right_item | None)]
+    """
+    left, right = iter(left), iter(right)
+    left_item, right_item = next(left, None), next(right, None)
+    while left_item is not None or right_item is not None:
+        if right_item is None or (left_item is not None and left_item[0] < right_item[0]):
+            yield left_item[0], left_item, None
+            left_item = next(left, None)
+        elif left_item is None or right_item[0] < left_item[0]:
+            yield right_item[0], None, right_item
+            right_item = next(right, None)
+        else:
+            yield left_item[0], left_item, right_item
+            left_item, right_item = next(left, None), next(right, None)
+
+
+def iter_chunk_digests(rows, prefix_length=PREFIX_LENGTH):
+    """
+    @param rows: iterable[tuple] - нормализованные строки, отсортированные по id
+    @param prefix_length: int
+    @return: generator[tuple(key, digest, rows_count)]
+    """
+    key, digest, count = None, None, 0
+    for row in rows:
+        row_key = row[0][:prefix_length]
+        if row_key != key:
+            if key is not None:
+                yield key, digest.hexdigest(), count
+            key, digest, count = row_key, hashlib.blake2b(digest_size=16), 0
+        digest.update(repr(row).encode())
+        count += 1
+    if key is not None:
+        yield key, digest.hexdigest(), count
+
+
+def compare_rows(sqlite_rows, pg_rows, report, max_diffs=MAX_DIFFS):
+    """
+    Построчное сравнение, результат дописывается в report
+    @param sqlite_rows: iterable[tuple]
+    @param pg_rows: iterable[tuple]
+    @param report: TableReport
+    @param max_diffs: int
+    """
+    for row_id, sqlite_row, pg_row in merge_by_key(sqlite_rows, pg_rows):
+        if pg_row is None:
+            diffs = report.missing_in_pg
+        elif sqlite_row is None:
+            diffs = report.missing_in_sqlite
+        elif sqlite_row != pg_row:
+            diffs = report.different
+        else:
+            continue
+        if len(diffs) < max_diffs:
+            diffs.append(row_id)
+
+
+def _compare_chunk(key, sqlite_conn, pg_conn, migration, report, batch_size, max_diffs, lowercase_ids):
+    lower, upper = chunk_bounds(key)
+    compare_rows(
+        iter_sqlite_rows(sqlite_conn, migration, lower, upper, batch_size, lowercase_ids),
+        iter_pg_rows(pg_conn, migration, lower, upper, batch_size),
+        report, max_diffs,
+    )
+
+
+def verify_table(sqlite_conn, pg_conn, migration, prefix_length=PREFIX_LENGTH, sample=None,
+                 batch_size=BATCH_SIZE, max_diffs=MAX_DIFFS):
+    """
+    @param sqlite_conn: sqlite3.Connection
+    @param pg_conn: connection_object
+    @param migration: load_data.TableMigration
+    @param prefix_length: int - длина префикса id, задающего блок (16 ** prefix_length блоков)
+    @param sample: float | None - доля случайных блоков для проверки, None - проверять всё
+    @param batch_size: int
+    @param max_diffs: int
+    @return: TableReport
+    """
+    report = TableReport(migration.sqlite_table)
+    lowercase_ids = has_lowercase_ids(sqlite_conn, migration)
+    if sample is None:
+        keys = None
+    else:
+        total = 16 ** prefix_length
+        keys = sorted(f'{key:0{prefix_length}x}' for key in random.sample(range(total), max(1, round(total * sample))))
+
+    def digests(rows_by_range):
+        if keys is None:
+            yield from iter_chunk_digests(rows_by_range(None, None), prefix_length)
+            return
+        for key in keys:
+            yield from iter_chunk_digests(rows_by_range(*chunk_bounds(key)), prefix_length)
+
+    mismatched = []
+    for key, sqlite_chunk, pg_chunk in merge_by_key(
+            digests(lambda lower, upper: iter_sqlite_rows(sqlite_conn, migration, lower, upper, batch_size,
+                                                          lowercase_ids)),
+            digests(lambda lower, upper: iter_pg_rows(pg_conn, migration, lower, upper, batch_size))):
+        report.chunks += 1
+        report.sqlite_rows += sqlite_chunk[2] if sqlite_chunk else 0
+        report.pg_rows += pg_chunk[2] if pg_chunk else 0
+        if sqlite_chunk is None or pg_chunk is None or sqlite_chunk[1] != pg_chunk[1]:
+            mismatched.append(key)
+
+    report.mismatched_chunks = len(mismatched)
+    for key in mismatched:
+        _compare_chunk(key, sqlite_conn, pg_conn, migration, report, batch_size, max_diffs, lowercase_ids)
+    return report
+
+
+def verify(sqlite_conn, pg_conn, migrations=MIGRATIONS, **kwargs):
+    """
+    @param sqlite_conn: sqlite3.Connection
+    @param pg_conn: connection_object
+    @param migrations: tuple[load_data.TableMigration]
+    @param kwargs: параметры verify_table
+    @return: list[TableReport]
+    """
+    return [verify_table(sqlite_conn, pg_conn, migration, **kwargs) for migration in migrations]
@@ -0,0 +1,290 @@
+import io
+import re
+import struct
+import uuid
+from datetime import date, datetime, timezone
+
+from psycopg2.extras import execute_values
+
+PG_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+PG_EPOCH_DATE = date(2000, 1, 1)
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+PGCOPY_TRAILER = struct.pack('!h', -1)
+
+SHORT_TZ_RE = re.compile(r'[+-]\d\d$')
+
+PG_SCHEMA = 'content'
+
+
+def parse_timestamp(value):
+    """
+    SQLite хранит время строкой вида '2021-06-16 20:14:09.221855+00'
+    @param value: str | datetime
+    @return: datetime
+    """
+    if isinstance(value, datetime):
+        result = value
+    else:
+        if SHORT_TZ_RE.search(value):
+            value += ':00'
+        result = datetime.fromisoformat(value)
+    if result.tzinfo is None:
+        result = result.replace(tzinfo=timezone.utc)
+    return result
+
+
+def _encode_uuid(value):
+    return uuid.UUID(str(value)).bytes
+
+
+def _encode_text(value):
+    return str(value).encode()
+
+
+def _encode_float8(value):
+    return struct.pack('!d', float(value))
+
+
+def _encode_date(value):
+    if not isinstance(value, date):
+        value = date.fromisoformat(value[:10])
+    return struct.pack('!i', (value - PG_EPOCH_DATE).days)
+
+
+def _encode_timestamp(value):
+    delta = parse_timestamp(value) - PG_EPOCH
+    return struct.pack('!q', (delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds)
+
+
+# OID типа Postgres -> функция кодирования значения в бинарный формат COPY
+BINARY_ENCODERS = {
+    25: _encode_text,  # text
+    1043: _encode_text,  # varchar
+    2950: _encode_uuid,  # uuid
+    701: _encode_float8,  # float8
+    1082: _encode_date,  # date
+    1114: _encode_timestamp,  # timestamp
+    1184: _encode_timestamp,  # timestamptz
+}
+
+
+def _copy_text_value(value):
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+class Writer:
+    """
+    Базовый класс записи пачки строк в таблицу {schema}.{table}.
+    concurrent_encode - encode можно выполнять в другом потоке одновременно с send
+    """
+    concurrent_encode = True
+
+    def __init__(self, pg_cursor, table, columns, upsert=False, version_column=None, schema=PG_SCHEMA,
+                 on_conflict=True):
+        """
+        @param pg_cursor: cursor_object
+        @param table: str
+        @param columns: tuple[str]
+        @param upsert: bool - обновлять уже существующие строки вместо того, чтобы пропускать их
+        @param version_column: str | None - колонка, по которой строка считается более новой (modified)
+        @param schema: str
+        @param on_conflict: bool - False для таблицы без первичного ключа (staging-схема blue/green загрузки):
+            ON CONFLICT без уникального индекса невозможен, строки только добавляются
+        """
+        self.pg_cursor = pg_cursor
+        self.table = table
+        self.columns = columns
+        self.upsert = upsert
+        self.version_column = version_column
+        self.schema = schema
+        self.on_conflict = on_conflict
+
+    @property
+    def target(self):
+        """
+        @return: str
+        """
+        return f'{self.schema}.{self.table}'
+
+    @property
+    def conflict_clause(self):
+        """
+        Строки в INSERT адресуются как target (существующая) и EXCLUDED (новая)
+        @return: str
+        """
+        if not self.on_conflict:
+            return ''
+        if not self.upsert:
+            return 'ON CONFLICT (id) DO NOTHING'
+        columns = [column for column in self.columns if column != 'id']
+        updates = ', '.join(f'{column} = EXCLUDED.{column}' for column in columns)
+        if self.version_column:
+            version = self.version_column
+            condition = f'target.{version} IS NULL OR target.{version} < EXCLUDED.{version}'
+        else:
+            condition = (f"({', '.join(f'target.{column}' for column in columns)}) IS DISTINCT FROM "
+                         f"({', '.join(f'EXCLUDED.{column}' for column in columns)})")
+        return f'ON CONFLICT (id) DO UPDATE SET {updates} WHERE {condition}'
+
+    def encode(self, data):
+        """
+        Подготовка пачки к отправке, выполняется на стороне Python
+        @param data: list[tuple]
+        @return: данные для send
+        """
+        return data
+
+    def send(self, payload):
+        """
+        Отправка подготовленной пачки в Postgres
+        @param payload: результат encode
+        """
+        raise NotImplementedError
+
+    def write(self, data):
+        """
+        @param data: list[tuple]
+        """
+        self.send(self.encode(data))
+
+
+class InsertWriter(Writer):
+    """Один INSERT на пачку, значения подставляются через mogrify"""
+    # mogrify использует курсор, которым в это время может выполняться send
+    concurrent_encode = False
+
+    def encode(self, data):
+        format_symbols = ', '.join(['%s'] * len(self.columns))
+        return ','.join(self.pg_cursor.mogrify(f"({format_symbols})", item).decode() for item in data)
+
+    def send(self, payload):
+        self.pg_cursor.execute(f"""
+            INSERT INTO {self.target} AS target ({', '.join(self.columns)})
+            VALUES {payload}
+            {self.conflict_clause}
+            """)
+
+
+class ValuesWriter(Writer):
+    """
+    psycopg2.extras.execute_values: пачка отправляется страницами без ручной склейки строки.
+    Кодирование значений происходит внутри execute_values, поэтому отдельного encode нет.
+    """
+
+    def send(self, payload):
+        columns = ', '.join(self.columns)
+        execute_values(
+            self.pg_cursor,
+            f"INSERT INTO {self.target} AS target ({columns}) VALUES %s {self.conflict_clause}",
+            payload,
+            page_size=len(payload),
+        )
+
+
+class CopyWriter(Writer):
+    """
+    COPY FROM STDIN во временную таблицу и перенос в {schema}.{table} одним INSERT ... SELECT.
+    COPY не поддерживает ON CONFLICT, поэтому конфликты разрешаются на шаге переноса.
+    Если конфликтов быть не может (on_conflict=False), COPY пишет сразу в целевую таблицу.
+    """
+    copy_format = 'text'
+
+    def __init__(self, pg_cursor, table, columns, **kwargs):
+        super().__init__(pg_cursor, table, columns, **kwargs)
+        if not self.on_conflict:
+            self.staging = None
+            return
+        self.staging = f'staging_{table}'
+        columns = ', '.join(self.columns)
+        self.pg_cursor.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS {self.staging} AS
+            SELECT {columns} FROM {self.target} WITH NO DATA
+            """)
+
+    @property
+    def copy_target(self):
+        """
+        @return: str - таблица, в которую пишет COPY
+        """
+        return self.staging or self.target
+
+    def encode(self, data):
+        """
+        @param data: list[tuple]
+        @return: file_object
+        """
+        return io.StringIO(''.join('\t'.join(_copy_text_value(value) for value in row) + '\n' for row in data))
+
+    def send(self, payload):
+        columns = ', '.join(self.columns)
+        if self.staging:
+            self.pg_cursor.execute(f"TRUNCATE {self.staging}")
+        self.pg_cursor.copy_expert(
+            f"COPY {self.copy_target} ({columns}) FROM STDIN WITH (FORMAT {self.copy_format})",
+            payload,
+        )
+        if not self.staging:
+            return
+        self.pg_cursor.execute(f"""
+            INSERT INTO {self.target} AS target ({columns})
+            SELECT {columns} FROM {self.staging}
+            {self.conflict_clause}
+            """)
+
+
+class BinaryCopyWriter(CopyWriter):
+    """COPY в бинарном формате: Postgres не разбирает текст, но значения нужно кодировать по типам колонок"""
+    copy_format = 'binary'
+
+    def __init__(self, pg_cursor, table, columns, **kwargs):
+        super().__init__(pg_cursor, table, columns, **kwargs)
+        self.pg_cursor.execute(f"SELECT {', '.join(self.columns)} FROM {self.copy_target} LIMIT 0")
+        try:
+            self.encoders = [BINARY_ENCODERS[column.type_code] for column in self.pg_cursor.description]
+        except KeyError as error:
+            raise ValueError(f'Тип с OID {error} в таблице {table} не поддерживается бинарным COPY')
+
+    def encode(self, data):
+        buffer = io.BytesIO()
+        buffer.write(PGCOPY_HEADER)
+        field_count = struct.pack('!h', len(self.encoders))
+        for row in data:
+            buffer.write(field_count)
+            for encoder, value in zip(self.encoders, row):
+                if value is None:
+                    buffer.write(struct.pack('!i', -1))
+                    continue
+                encoded = encoder(value)
+                buffer.write(struct.pack('!i', len(encoded)))
+                buffer.write(encoded)
+        buffer.write(PGCOPY_TRAILER)
+        buffer.seek(0)
+        return buffer
+
+
+WRITERS = {
+    'insert': InsertWriter,
+    'values': ValuesWriter,
+    'copy_text': CopyWriter,
+    'copy_binary': BinaryCopyWriter,
+}
+DEFAULT_WRITER = 'copy_text'
+
+
+def get_writer(backend, pg_cursor, table, columns, **kwargs):
+    """
+    @param backend: str - ключ из WRITERS
+    @param pg_cursor: cursor_object
+    @param table: str
+    @param columns: tuple[str]
+    @param kwargs: upsert, version_column, schema, on_conflict - см. Writer
+    @return: Writer
+    """
+    try:
+        writer_class = WRITERS[backend]
+    except KeyError:
+        raise ValueError(f'Неизвестный способ записи {backend}, доступны: {", ".join(WRITERS)}')
+    return writer_class(pg_cursor, table, columns, **kwargs)